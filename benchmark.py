@@ -0,0 +1,239 @@
+# Benchmark reproducible del gestor de pedidos.
+#
+# Genera pedidos sintéticos con distribuciones realistas (estados, fechas,
+# precios, productos), recorre las rutas principales con el cliente de
+# pruebas de Flask e informa p50/p95 de latencia, número de consultas SQL y
+# memoria pico por escenario. Sin --base usa un SQLite temporal, así que no
+# necesita servicios externos.
+#
+#   python benchmark.py
+#   python benchmark.py --filas 1000 100000 1000000 --repeticiones 30
+#   python benchmark.py --base postgresql://usuario@localhost/bench --json resultados.json
+#
+# Los tamaños se alcanzan de forma incremental sobre la misma base (1k, luego
+# se añaden hasta 100k, etc.). ¡No apuntes --base a la base de producción!
+import argparse
+import json
+import math
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from datetime import datetime, timedelta
+
+SEMILLA = 20240601
+LOTE_INSERCION = 5000
+
+PRODUCTOS = {
+    'Bandeja': 35.0, 'Tabla de cortar': 28.0, 'Letrero': 45.0, 'Caja': 30.0,
+    'Posavasos': 12.0, 'Llavero': 6.0, 'Cuadro': 60.0, 'Mesa': 180.0,
+}
+PESOS_PRODUCTOS = [20, 18, 14, 12, 12, 10, 9, 5]
+FORMAS_CONTACTO = ['WhatsApp', 'Instagram', 'Teléfono', 'Email', 'Otro']
+PESOS_CONTACTO = [50, 30, 10, 8, 2]
+NOMBRES = ['Ana', 'Luis', 'María', 'José', 'Lucía', 'Carlos', 'Elena', 'Javier', 'Sofía', 'Pablo',
+           'Carmen', 'Diego', 'Laura', 'Miguel', 'Paula', 'Andrés', 'Marta', 'Raúl', 'Irene', 'Hugo']
+APELLIDOS = ['García', 'Martínez', 'López', 'Sánchez', 'Pérez', 'Gómez', 'Martín', 'Jiménez',
+             'Ruiz', 'Hernández', 'Díaz', 'Moreno', 'Muñoz', 'Álvarez', 'Romero', 'Navarro']
+PALABRAS_DETALLE = ['grabado', 'nombre', 'fecha', 'roble', 'nogal', 'pino', 'barnizado', 'natural',
+                    'regalo', 'boda', 'cumpleaños', 'logo', 'empresa', 'pato', 'flores', 'urgente']
+
+
+def generar_pedidos(rng, cantidad, ahora, dias_historia):
+    for _ in range(cantidad):
+        # Más pedidos recientes que antiguos
+        dias_atras = dias_historia * rng.random() ** 1.5
+        fecha = ahora - timedelta(days=dias_atras, seconds=rng.randrange(86400))
+        producto = rng.choices(list(PRODUCTOS), PESOS_PRODUCTOS)[0]
+        precio = round(PRODUCTOS[producto] * rng.lognormvariate(0, 0.3), 2)
+
+        if dias_atras > 30:
+            estado_pedido = 'Completado' if rng.random() < 0.9 else rng.choice(['Pendiente', 'En Progreso'])
+        else:
+            estado_pedido = rng.choices(['Pendiente', 'En Progreso', 'Completado'], [50, 30, 20])[0]
+        if estado_pedido == 'Completado':
+            anticipo = precio
+        else:
+            anticipo = rng.choices([0.0, round(precio / 2, 2), precio], [40, 45, 15])[0]
+
+        forma_contacto = rng.choices(FORMAS_CONTACTO, PESOS_CONTACTO)[0]
+        nombre = f'{rng.choice(NOMBRES)} {rng.choice(APELLIDOS)}'
+        if forma_contacto == 'Instagram':
+            contacto_detalle = '@' + nombre.split()[0].lower() + str(rng.randrange(1000))
+        elif forma_contacto == 'Email':
+            contacto_detalle = nombre.split()[0].lower() + '@example.com'
+        else:
+            contacto_detalle = '6' + ''.join(str(rng.randrange(10)) for _ in range(8))
+
+        yield {
+            'nombre_cliente': nombre,
+            'forma_contacto': forma_contacto,
+            'contacto_detalle': contacto_detalle,
+            'direccion_entrega': f'Calle {rng.choice(APELLIDOS)} {rng.randrange(1, 200)}',
+            'producto': producto,
+            'detalles': ' '.join(rng.sample(PALABRAS_DETALLE, rng.randrange(1, 5))),
+            'precio': precio,
+            'anticipo': anticipo,
+            'imagen_path': None,
+            'estado_pago': main.calcular_estado_pago(precio, anticipo),
+            'estado_pedido': estado_pedido,
+            'fecha_creacion': fecha,
+        }
+
+
+def sembrar(cantidad, rng, ahora, dias_historia):
+    db = main.db
+    lote = []
+    for fila in generar_pedidos(rng, cantidad, ahora, dias_historia):
+        lote.append(fila)
+        if len(lote) == LOTE_INSERCION:
+            db.session.execute(db.insert(main.Pedido), lote)
+            lote = []
+    if lote:
+        db.session.execute(db.insert(main.Pedido), lote)
+    db.session.commit()
+
+    # Las tablas derivadas se reconstruyen de una vez en lugar de fila a fila
+    runner = main.app.test_cli_runner()
+    for comando in main.COMANDOS_RECONSTRUCCION:
+        resultado = runner.invoke(args=[comando])
+        if resultado.exit_code != 0:
+            raise RuntimeError(f'{comando} falló: {resultado.output}') from resultado.exception
+
+
+def escenarios(total, ahora):
+    Pedido = main.Pedido
+    profundo = Pedido.query.order_by(Pedido.fecha_creacion.desc(), Pedido.id.desc()) \
+        .offset(int(total * 0.9)).first()
+    # La rejilla de seis semanas que pinta el calendario, terminando hoy: los
+    # pedidos sintéticos son todos anteriores a `ahora`
+    fin_rejilla = ahora.date() + timedelta(days=1)
+    inicio_rejilla = fin_rejilla - timedelta(weeks=6)
+    return [
+        ('index', '/'),
+        ('index (página al 90%)', f'/?despues={main.codificar_cursor(profundo)}'),
+        ('index ?search=', '/?search=bandeja'),
+        ('api_buscar', '/api/buscar?q=gar'),
+        ('api_graficos', '/api/graficos'),
+        ('api_calendario (6 semanas)', f'/api/calendario?start={inicio_rejilla}&end={fin_rejilla}'),
+        ('api_informes (semana)', '/api/informes?granularidad=semana&agrupar=producto'),
+        ('export_csv', '/export/csv'),
+        ('export_csv ?gzip=1', '/export/csv?gzip=1'),
+    ]
+
+
+class ContadorConsultas:
+    def __init__(self):
+        self.total = 0
+
+    def __call__(self, *args, **kwargs):
+        self.total += 1
+
+
+def ejecutar(cliente, url, contador):
+    contador.total = 0
+    inicio = time.perf_counter()
+    response = cliente.get(url, buffered=False)
+    tamano = sum(len(trozo) for trozo in response.iter_encoded())
+    response.close()
+    duracion = time.perf_counter() - inicio
+    if response.status_code != 200:
+        raise RuntimeError(f'{url} devolvió {response.status_code}')
+    return duracion, contador.total, tamano
+
+
+def percentil(valores, p):
+    ordenados = sorted(valores)
+    return ordenados[max(0, math.ceil(p / 100 * len(ordenados)) - 1)]
+
+
+def medir(cliente, url, repeticiones, contador):
+    ejecutar(cliente, url, contador)  # calentamiento
+    tiempos = []
+    for _ in range(repeticiones):
+        duracion, consultas, tamano = ejecutar(cliente, url, contador)
+        tiempos.append(duracion)
+
+    # La memoria se mide en una pasada aparte: tracemalloc ralentiza
+    tracemalloc.start()
+    ejecutar(cliente, url, contador)
+    _, pico = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return {
+        'p50_ms': percentil(tiempos, 50) * 1000,
+        'p95_ms': percentil(tiempos, 95) * 1000,
+        'consultas': consultas,
+        'memoria_pico_kb': pico / 1024,
+        'bytes': tamano,
+    }
+
+
+def imprimir(total, resultados):
+    print(f'\n== {total:,} pedidos ==')
+    print(f'{"escenario":<26} {"p50 ms":>9} {"p95 ms":>9} {"consultas":>9} {"mem. pico KB":>13} {"bytes":>12}')
+    for nombre, r in resultados.items():
+        print(f'{nombre:<26} {r["p50_ms"]:>9.1f} {r["p95_ms"]:>9.1f} {r["consultas"]:>9} '
+              f'{r["memoria_pico_kb"]:>13.0f} {r["bytes"]:>12,}')
+
+
+def parsear_argumentos():
+    parser = argparse.ArgumentParser(description='Benchmark del gestor de pedidos.')
+    parser.add_argument('--filas', type=int, nargs='+', default=[1000, 100000],
+                        help='Tamaños de tabla a medir (orden creciente). Por defecto: 1000 100000.')
+    parser.add_argument('--repeticiones', type=int, default=20, help='Repeticiones por escenario.')
+    parser.add_argument('--repeticiones-export', type=int, default=3,
+                        help='Repeticiones para las exportaciones completas.')
+    parser.add_argument('--dias', type=int, default=3 * 365, help='Días de histórico simulado.')
+    parser.add_argument('--base', help='URL de base de datos (por defecto, un SQLite temporal).')
+    parser.add_argument('--json', help='Guarda los resultados en este archivo.')
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = parsear_argumentos()
+    if args.base:
+        os.environ['DATABASE_URL'] = args.base
+    else:
+        directorio = tempfile.mkdtemp(prefix='robleka-bench-')
+        os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(directorio, 'bench.db')
+    os.environ.setdefault('ALMACEN_IMAGENES', 'local')
+
+    import main
+    from flask_migrate import upgrade
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    main.app.config['TESTING'] = True
+    rng = random.Random(SEMILLA)
+    ahora = datetime(2026, 6, 1, 12, 0, 0)
+    contador = ContadorConsultas()
+    event.listen(Engine, 'before_cursor_execute', contador)
+
+    todos = {}
+    with main.app.app_context():
+        upgrade(directory=os.path.join(os.path.dirname(os.path.abspath(__file__)), 'migrations'))
+        cliente = main.app.test_client()
+        with cliente.session_transaction() as sesion:
+            sesion['_user_id'] = 'robleka'
+            sesion['_fresh'] = True
+
+        actual = main.Pedido.query.count()
+        for total in sorted(args.filas):
+            if total > actual:
+                inicio = time.perf_counter()
+                sembrar(total - actual, rng, ahora, args.dias)
+                print(f'Sembrados {total - actual:,} pedidos en {time.perf_counter() - inicio:.1f} s',
+                      file=sys.stderr)
+                actual = total
+            resultados = {}
+            for nombre, url in escenarios(actual, ahora):
+                repeticiones = args.repeticiones_export if nombre.startswith('export') else args.repeticiones
+                resultados[nombre] = medir(cliente, url, repeticiones, contador)
+            imprimir(actual, resultados)
+            todos[actual] = resultados
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump(todos, f, indent=2, ensure_ascii=False)
@@ -1,21 +1,48 @@
-from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, make_response
+from flask import Flask, render_template, request, redirect, url_for, jsonify, flash, make_response, abort, Response, stream_with_context, send_from_directory, g, has_request_context, before_render_template, template_rendered, session
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as SesionFlask
+from flask.globals import app_ctx
 from flask_migrate import Migrate
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.orm import scoped_session, sessionmaker
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.sql.expression import FunctionElement
 import os
 from werkzeug.utils import secure_filename
+from werkzeug.http import is_resource_modified
 from collections import Counter
-from datetime import datetime
+from datetime import datetime, timedelta
 import json
+import math
+import re
 import io
 import csv
 import importlib
-import math
+import base64
+import binascii
+import click
+import zlib
+import shutil
+import threading
+import time
+import uuid
+import hashlib
+import functools
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
 
 import cloudinary
 import cloudinary.uploader
 import cloudinary.api
 
+try:
+    from PIL import Image, ImageOps
+except ImportError:  # Sin Pillow no se generan miniaturas locales
+    Image = None
+
 app = Flask(__name__)
 
 # --- Configuración de Cloudinary ---
@@ -28,11 +55,216 @@ cloudinary.config(
 
 app.secret_key = os.environ.get('SECRET_KEY', 'a_very_secret_dev_key')
 
+# --- Configuración de la subida de imágenes ---
+# ALMACEN_IMAGENES: 'cloudinary' (producción) o 'local' (sin red, para desarrollo y pruebas).
+# SUBIDAS_SINCRONAS: ejecuta las tareas de imagen en la propia petición (pruebas).
+app.config['ALMACEN_IMAGENES'] = os.environ.get('ALMACEN_IMAGENES', 'cloudinary')
+app.config['SUBIDAS_SINCRONAS'] = os.environ.get('SUBIDAS_SINCRONAS') == '1'
+app.config['SUBIDAS_HILOS'] = int(os.environ.get('SUBIDAS_HILOS', '2'))
+
+# --- Configuración de la instrumentación ---
+# SQL_LENTA_MS: umbral del registro de consultas lentas.
+# METRICS_TOKEN: si se define, /metrics exige 'Authorization: Bearer <token>';
+#   si no, exige la sesión del panel. Nunca es pública.
+app.config['SQL_LENTA_MS'] = float(os.environ.get('SQL_LENTA_MS', '200'))
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
 # --- Configuración de SQLAlchemy para PostgreSQL ---
+# DATABASE_URL: base principal; todas las escrituras van aquí.
+# DATABASE_URL_LECTURA: réplica de solo lectura opcional para los agregados
+#   del panel, la búsqueda y las exportaciones (ver sesion_lectura()).
+# DB_POOL_SIZE, DB_MAX_OVERFLOW, DB_POOL_RECYCLE (s), DB_POOL_PRE_PING (1/0):
+#   pool de conexiones de cada motor.
+# DB_TIMEOUT_SENTENCIA_MS: statement_timeout por sentencia (solo PostgreSQL).
+def opciones_motor(url):
+    opciones = {
+        'pool_pre_ping': os.environ.get('DB_POOL_PRE_PING', '1') == '1',
+        'pool_recycle': int(os.environ.get('DB_POOL_RECYCLE', '1800')),
+    }
+    for variable, opcion in (('DB_POOL_SIZE', 'pool_size'), ('DB_MAX_OVERFLOW', 'max_overflow')):
+        if os.environ.get(variable):
+            opciones[opcion] = int(os.environ[variable])
+    timeout = os.environ.get('DB_TIMEOUT_SENTENCIA_MS')
+    if timeout and url and url.startswith('postgres'):
+        opciones['connect_args'] = {'options': f'-c statement_timeout={int(timeout)}'}
+    return opciones
+
 app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL')
+app.config['SQLALCHEMY_ENGINE_OPTIONS'] = opciones_motor(app.config['SQLALCHEMY_DATABASE_URI'])
+if os.environ.get('DATABASE_URL_LECTURA'):
+    app.config['SQLALCHEMY_BINDS'] = {
+        'lectura': {'url': os.environ['DATABASE_URL_LECTURA'], **opciones_motor(os.environ['DATABASE_URL_LECTURA'])},
+    }
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 db = SQLAlchemy(app)
-migrate = Migrate(app, db)
+
+def _incluir_en_migraciones(objeto, nombre, tipo, reflejado, comparado_con):
+    # La tabla de búsqueda (y las tablas internas de FTS5) se crean con SQL
+    # propio de cada motor y no forman parte de los modelos.
+    return not (tipo == 'table' and nombre.startswith('pedido_busqueda'))
+
+migrate = Migrate(app, db, include_object=_incluir_en_migraciones)
+
+# --- Réplica de lectura ---
+# Las consultas que toleran algo de retraso de replicación usan
+# sesion_lectura(): la réplica si hay bind 'lectura' y, si no, db.session.
+class SesionLectura(SesionFlask):
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        return bind if bind is not None else self._db.engines['lectura']
+
+_sesion_lectura = scoped_session(
+    sessionmaker(class_=SesionLectura, db=db, query_cls=db.Query),
+    scopefunc=lambda: id(app_ctx._get_current_object())
+)
+
+@app.teardown_appcontext
+def _cerrar_sesion_lectura(exc):
+    _sesion_lectura.remove()
+
+def sesion_lectura():
+    return _sesion_lectura if 'lectura' in db.engines else db.session
+
+# --- Instrumentación de peticiones ---
+# Por petición se mide el número de consultas SQL y su tiempo, el render de
+# plantillas y las llamadas al almacén de imágenes; se envían en la cabecera
+# Server-Timing y se acumulan en las métricas de /metrics (por proceso).
+LIMITES_LATENCIA = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+def _etiquetas_prometheus(etiquetas):
+    if not etiquetas:
+        return ''
+    pares = ','.join('{}="{}"'.format(clave, str(valor).replace('\\', '\\\\').replace('"', '\\"'))
+                     for clave, valor in etiquetas)
+    return '{' + pares + '}'
+
+class Contador:
+    def __init__(self, nombre, ayuda):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.valores = {}
+        self.lock = threading.Lock()
+
+    def sumar(self, valor=1, **etiquetas):
+        clave = tuple(sorted(etiquetas.items()))
+        with self.lock:
+            self.valores[clave] = self.valores.get(clave, 0) + valor
+
+    def exponer(self):
+        yield f'# HELP {self.nombre} {self.ayuda}'
+        yield f'# TYPE {self.nombre} counter'
+        with self.lock:
+            for clave, valor in sorted(self.valores.items()):
+                yield f'{self.nombre}{_etiquetas_prometheus(clave)} {valor}'
+
+class Histograma:
+    def __init__(self, nombre, ayuda, limites=LIMITES_LATENCIA):
+        self.nombre = nombre
+        self.ayuda = ayuda
+        self.limites = limites
+        self.series = {}  # etiquetas -> [cuentas por límite, suma, total]
+        self.lock = threading.Lock()
+
+    def observar(self, valor, **etiquetas):
+        clave = tuple(sorted(etiquetas.items()))
+        with self.lock:
+            cuentas, suma, total = self.series.get(clave, ([0] * len(self.limites), 0.0, 0))
+            cuentas = [cuenta + (valor <= limite) for cuenta, limite in zip(cuentas, self.limites)]
+            self.series[clave] = (cuentas, suma + valor, total + 1)
+
+    def exponer(self):
+        yield f'# HELP {self.nombre} {self.ayuda}'
+        yield f'# TYPE {self.nombre} histogram'
+        with self.lock:
+            for clave, (cuentas, suma, total) in sorted(self.series.items()):
+                for limite, cuenta in zip(self.limites, cuentas):
+                    yield f'{self.nombre}_bucket{_etiquetas_prometheus(clave + (("le", limite),))} {cuenta}'
+                yield f'{self.nombre}_bucket{_etiquetas_prometheus(clave + (("le", "+Inf"),))} {total}'
+                yield f'{self.nombre}_sum{_etiquetas_prometheus(clave)} {suma}'
+                yield f'{self.nombre}_count{_etiquetas_prometheus(clave)} {total}'
+
+METRICAS = {
+    'peticiones': Contador('robleka_peticiones_total', 'Peticiones atendidas por endpoint y código.'),
+    'latencia': Histograma('robleka_peticion_segundos', 'Latencia de las peticiones por endpoint.'),
+    'consultas': Contador('robleka_consultas_sql_total', 'Consultas SQL ejecutadas por endpoint.'),
+    'sql': Contador('robleka_sql_segundos_total', 'Tiempo en consultas SQL por endpoint.'),
+    'lentas': Contador('robleka_consultas_lentas_total', 'Consultas que superan SQL_LENTA_MS.'),
+    'almacen': Histograma('robleka_almacen_segundos', 'Duración de las llamadas al almacén de imágenes.'),
+}
+
+def _sumar_tiempo(clave, segundos):
+    if has_request_context() and 'tiempos' in g:
+        g.tiempos[clave] = g.tiempos.get(clave, 0.0) + segundos
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _antes_de_consulta(conn, cursor, statement, parameters, context, executemany):
+    conn.info.setdefault('inicio_consulta', []).append(time.perf_counter())
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _despues_de_consulta(conn, cursor, statement, parameters, context, executemany):
+    duracion = time.perf_counter() - conn.info['inicio_consulta'].pop()
+    if has_request_context() and 'tiempos' in g:
+        g.consultas += 1
+        _sumar_tiempo('sql', duracion)
+    if duracion * 1000 >= app.config['SQL_LENTA_MS']:
+        METRICAS['lentas'].sumar()
+        app.logger.warning('Consulta lenta (%.1f ms): %s', duracion * 1000, statement)
+
+@contextmanager
+def medir_almacen(operacion):
+    inicio = time.perf_counter()
+    try:
+        yield
+    finally:
+        duracion = time.perf_counter() - inicio
+        METRICAS['almacen'].observar(duracion, operacion=operacion)
+        _sumar_tiempo('almacen', duracion)
+
+@before_render_template.connect_via(app)
+def _antes_de_plantilla(sender, template, context, **extra):
+    if 'tiempos' in g:
+        g.inicio_plantilla = time.perf_counter()
+
+@template_rendered.connect_via(app)
+def _despues_de_plantilla(sender, template, context, **extra):
+    if 'inicio_plantilla' in g:
+        _sumar_tiempo('tpl', time.perf_counter() - g.pop('inicio_plantilla'))
+
+@app.before_request
+def _iniciar_medicion():
+    g.inicio_peticion = time.perf_counter()
+    g.consultas = 0
+    g.tiempos = {}
+
+@app.after_request
+def _registrar_medicion(response):
+    if 'inicio_peticion' not in g:
+        return response
+    duracion = time.perf_counter() - g.inicio_peticion
+    endpoint = request.endpoint or 'desconocido'
+    METRICAS['peticiones'].sumar(endpoint=endpoint, codigo=response.status_code)
+    METRICAS['latencia'].observar(duracion, endpoint=endpoint)
+    METRICAS['consultas'].sumar(g.consultas, endpoint=endpoint)
+    METRICAS['sql'].sumar(g.tiempos.get('sql', 0.0), endpoint=endpoint)
+
+    partes = [f'sql;dur={g.tiempos.get("sql", 0.0) * 1000:.1f};desc="{g.consultas} consultas"']
+    if 'tpl' in g.tiempos:
+        partes.append(f'tpl;dur={g.tiempos["tpl"] * 1000:.1f};desc="plantilla"')
+    if 'almacen' in g.tiempos:
+        partes.append(f'almacen;dur={g.tiempos["almacen"] * 1000:.1f};desc="imagenes"')
+    partes.append(f'total;dur={duracion * 1000:.1f}')
+    response.headers['Server-Timing'] = ', '.join(partes)
+    return response
+
+@app.route('/metrics')
+def metrics():
+    token = app.config['METRICS_TOKEN']
+    if token:
+        if request.headers.get('Authorization') != f'Bearer {token}':
+            abort(401)
+    elif not current_user.is_authenticated:
+        return login_manager.unauthorized()
+    lineas = [linea for metrica in METRICAS.values() for linea in metrica.exponer()]
+    return Response('\n'.join(lineas) + '\n', mimetype='text/plain; version=0.0.4')
 
 # --- CREACIÓN DE TABLAS: Asegurarse de que se ejecuta al inicio ---
 # Esta parte se ejecutará cuando Gunicorn cargue la aplicación
@@ -40,6 +272,7 @@ migrate = Migrate(app, db)
 #     db.create_all()
 
 PEDIDOS_POR_PAGINA = 10
+EXPORTACION_LOTE = 1000
 
 # --- Definición del Modelo de Pedido con SQLAlchemy ---
 class Pedido(db.Model):
@@ -53,13 +286,120 @@ class Pedido(db.Model):
     precio = db.Column(db.Float, nullable=False)
     anticipo = db.Column(db.Float, default=0.0)
     imagen_path = db.Column(db.String(255))
+    imagen_estado = db.Column(db.String(20))  # None, 'pendiente', 'subida', 'error' o 'externa'
+    imagen_derivadas = db.Column(db.Text)  # JSON {variante: archivo} de las miniaturas locales
     estado_pago = db.Column(db.String(50), nullable=False)
     estado_pedido = db.Column(db.String(50), nullable=False)
     fecha_creacion = db.Column(db.DateTime, default=datetime.utcnow)
 
+    # Índice para la paginación por cursor sobre (fecha_creacion, id)
+    __table_args__ = (db.Index('ix_pedido_fecha_creacion_id', 'fecha_creacion', 'id'),)
+
     def __repr__(self):
         return f'<Pedido {self.id} - {self.nombre_cliente}>'
 
+    def variantes_imagen(self):
+        # URLs de miniatura/mediana; vacío si aún no hay derivadas (se usa imagen_path)
+        if es_imagen_cloudinary(self.imagen_path):
+            return {variante: transformar_url_cloudinary(self.imagen_path, transformacion)
+                    for variante, (_, transformacion) in VARIANTES_IMAGEN.items()}
+        if self.imagen_derivadas:
+            return {variante: url_for('imagen_derivada', nombre=archivo)
+                    for variante, archivo in json.loads(self.imagen_derivadas).items()}
+        return {}
+
+# --- Tablas de resumen del panel ---
+# Se mantienen con deltas desde las rutas de escritura para que index() no
+# tenga que agregar toda la tabla Pedido en cada carga.
+# `flask reconstruir-resumen` las recalcula desde cero.
+class ResumenTotales(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    total_facturado = db.Column(db.Float, nullable=False, default=0.0)
+    monto_pendiente = db.Column(db.Float, nullable=False, default=0.0)
+
+class ResumenEstado(db.Model):
+    estado_pedido = db.Column(db.String(50), primary_key=True)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+
+class ResumenMensual(db.Model):
+    mes = db.Column(db.String(7), primary_key=True)  # 'YYYY-MM'
+    ingresos = db.Column(db.Float, nullable=False, default=0.0)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+
+class ResumenDiario(db.Model):
+    fecha = db.Column(db.String(10), primary_key=True)  # 'YYYY-MM-DD'
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+
+# Contador de cambios de los pedidos (una sola fila, id=1). Cada escritura lo
+# incrementa en su misma transacción y las vistas lo usan como ETag y
+# Last-Modified para responder 304 si nada ha cambiado (ver condicional()).
+class VersionDatos(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    version = db.Column(db.Integer, nullable=False, default=0)
+    modificado = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
+
+# Serie diaria por producto × forma de contacto × estado de pago para los
+# informes de /api/informes, que la agrupan por día, semana o mes sin leer
+# la tabla Pedido. `flask reconstruir-series` la recalcula desde cero.
+class SerieDiaria(db.Model):
+    dia = db.Column(db.Date, primary_key=True)
+    producto = db.Column(db.String(100), primary_key=True)
+    forma_contacto = db.Column(db.String(50), primary_key=True)
+    estado_pago = db.Column(db.String(50), primary_key=True)
+    cantidad = db.Column(db.Integer, nullable=False, default=0)
+    importe = db.Column(db.Float, nullable=False, default=0.0)  # suma de precios
+    anticipos = db.Column(db.Float, nullable=False, default=0.0)
+    pendiente = db.Column(db.Float, nullable=False, default=0.0)
+
+# --- Agrupación de fechas portable entre motores ---
+# dia_de/semana_de/mes_de(columna) devuelven el periodo como texto
+# ('YYYY-MM-DD', lunes de la semana 'YYYY-MM-DD' y 'YYYY-MM'), con TO_CHAR
+# en PostgreSQL y strftime en SQLite.
+class dia_de(FunctionElement):
+    type = db.String()
+    inherit_cache = True
+
+class semana_de(FunctionElement):
+    type = db.String()
+    inherit_cache = True
+
+class mes_de(FunctionElement):
+    type = db.String()
+    inherit_cache = True
+
+PERIODOS_FECHA = {'dia': dia_de, 'semana': semana_de, 'mes': mes_de}
+
+@compiles(dia_de)
+def _dia_de(element, compiler, **kw):
+    return "to_char(%s, 'YYYY-MM-DD')" % compiler.process(element.clauses, **kw)
+
+@compiles(semana_de)
+def _semana_de(element, compiler, **kw):
+    return "to_char(date_trunc('week', %s), 'YYYY-MM-DD')" % compiler.process(element.clauses, **kw)
+
+@compiles(mes_de)
+def _mes_de(element, compiler, **kw):
+    return "to_char(%s, 'YYYY-MM')" % compiler.process(element.clauses, **kw)
+
+@compiles(dia_de, 'sqlite')
+def _dia_de_sqlite(element, compiler, **kw):
+    return "strftime('%%Y-%%m-%%d', %s)" % compiler.process(element.clauses, **kw)
+
+@compiles(semana_de, 'sqlite')
+def _semana_de_sqlite(element, compiler, **kw):
+    # 'weekday 0' avanza al domingo (o lo deja si ya lo es); 6 días antes es el lunes
+    return "strftime('%%Y-%%m-%%d', %s, 'weekday 0', '-6 days')" % compiler.process(element.clauses, **kw)
+
+@compiles(mes_de, 'sqlite')
+def _mes_de_sqlite(element, compiler, **kw):
+    return "strftime('%%Y-%%m', %s)" % compiler.process(element.clauses, **kw)
+
+def periodo_python(fecha, granularidad):
+    # Equivalente en Python de PERIODOS_FECHA
+    if granularidad == 'semana':
+        return (fecha - timedelta(days=fecha.weekday())).strftime('%Y-%m-%d')
+    return fecha.strftime('%Y-%m' if granularidad == 'mes' else '%Y-%m-%d')
+
 # --- Configuración de Flask-Login ---
 login_manager = LoginManager()
 login_manager.init_app(app)
@@ -85,6 +425,633 @@ def allowed_file(filename):
 
 # No necesitamos get_db_connection() ni init_db() con SQLAlchemy
 
+def datos_pedido(pedido):
+    return {column.name: getattr(pedido, column.name) for column in Pedido.__table__.columns}
+
+ESTADOS_PEDIDO = ('Pendiente', 'En Progreso', 'Completado')
+IMPORTACION_LOTE = 500
+
+def validar_pedido(nombre_cliente, forma_contacto, producto, precio, anticipo, **otros_textos):
+    # otros_textos: más columnas de texto de Pedido (contacto_detalle, ...)
+    # cuya longitud hay que comprobar
+    errors = []
+    if not nombre_cliente: errors.append('El nombre del cliente es obligatorio.')
+    if not forma_contacto: errors.append('La forma de contacto es obligatoria.')
+    if not producto: errors.append('El producto es obligatorio.')
+
+    textos = dict(nombre_cliente=nombre_cliente, forma_contacto=forma_contacto, producto=producto, **otros_textos)
+    for campo, valor in textos.items():
+        longitud = Pedido.__table__.columns[campo].type.length
+        if valor and longitud and len(valor) > longitud:
+            errors.append(f'El campo {campo} admite como máximo {longitud} caracteres.')
+
+    # NaN pasaría todas las comparaciones e infinito rompería los totales
+    if not (math.isfinite(precio) and math.isfinite(anticipo)):
+        errors.append('El precio y el anticipo deben ser números finitos.')
+        return errors
+    if precio <= 0: errors.append('El precio debe ser un número positivo.')
+    if anticipo < 0: errors.append('El anticipo no puede ser negativo.')
+    if anticipo > precio: errors.append('El anticipo no puede ser mayor que el precio total.')
+    return errors
+
+def calcular_estado_pago(precio, anticipo):
+    if anticipo == precio:
+        return 'Pagado Completo'
+    elif anticipo > 0:
+        return 'Anticipo Pagado'
+    return 'Pendiente'
+
+# --- Búsqueda indexada ---
+# Cada pedido tiene un documento de búsqueda en `pedido_busqueda`, mantenido
+# desde registrar_cambio_pedido(). En PostgreSQL es una columna tsvector con
+# índices GIN (texto completo y pg_trgm); en SQLite, una tabla virtual FTS5.
+CAMPOS_BUSQUEDA = ('nombre_cliente', 'producto', 'estado_pedido', 'detalles', 'contacto_detalle')
+BUSQUEDA_LIMITE = 10
+
+def documento_busqueda(datos):
+    return ' '.join(datos[campo] for campo in CAMPOS_BUSQUEDA if datos[campo])
+
+def _terminos_busqueda(texto):
+    return re.findall(r'\w+', texto.lower())
+
+class BusquedaSimple:
+    # Para motores sin índice de texto: el ilike de siempre sobre Pedido.
+    def coincidencias(self, texto):
+        condicion = db.false()
+        for campo in CAMPOS_BUSQUEDA:
+            condicion = condicion | getattr(Pedido, campo).ilike(f'%{texto}%')
+        return db.select(Pedido.id.label('pedido_id'), db.literal(0.0).label('rango')).where(condicion)
+
+    def guardar(self, documentos):
+        pass
+
+    def borrar(self, pedido_ids):
+        pass
+
+class BusquedaPostgres:
+    tabla = db.table('pedido_busqueda', db.column('pedido_id'), db.column('documento'), db.column('vector'))
+    columna_id = 'pedido_id'
+
+    def coincidencias(self, texto):
+        terminos = _terminos_busqueda(texto)
+        consulta = db.func.to_tsquery('spanish', ' & '.join(f'{termino}:*' for termino in terminos) or "''")
+        rango = db.func.ts_rank(self.tabla.c.vector, consulta) + db.func.similarity(self.tabla.c.documento, texto)
+        return db.select(self.tabla.c.pedido_id, rango.label('rango')).where(
+            self.tabla.c.vector.op('@@')(consulta) | self.tabla.c.documento.ilike(f'%{texto}%')
+        )
+
+    def guardar(self, documentos):
+        # documentos: lista de (pedido_id, documento)
+        if not documentos:
+            return
+        self.borrar([pedido_id for pedido_id, _ in documentos])
+        db.session.execute(db.text(f'INSERT INTO pedido_busqueda ({self.columna_id}, documento) VALUES (:id, :documento)'),
+                           [{'id': pedido_id, 'documento': documento} for pedido_id, documento in documentos])
+
+    def borrar(self, pedido_ids):
+        if not pedido_ids:
+            return
+        sentencia = db.text(f'DELETE FROM pedido_busqueda WHERE {self.columna_id} IN :ids') \
+            .bindparams(db.bindparam('ids', expanding=True))
+        db.session.execute(sentencia, {'ids': list(pedido_ids)})
+
+class BusquedaSQLite(BusquedaPostgres):
+    tabla = db.table('pedido_busqueda', db.column('rowid'), db.column('rank'))
+    columna_id = 'rowid'
+
+    def coincidencias(self, texto):
+        terminos = _terminos_busqueda(texto)
+        consulta = ' '.join(f'"{termino}"*' for termino in terminos)
+        return db.select(self.tabla.c.rowid.label('pedido_id'), (-self.tabla.c.rank).label('rango')).where(
+            db.literal_column('pedido_busqueda').op('MATCH')(consulta) if terminos else db.false()
+        )
+
+MOTORES_BUSQUEDA = {'postgresql': BusquedaPostgres, 'sqlite': BusquedaSQLite}
+
+def motor_busqueda():
+    return MOTORES_BUSQUEDA.get(db.engine.dialect.name, BusquedaSimple)()
+
+def filtrar_busqueda(query, search_term):
+    if search_term:
+        coincidencias = motor_busqueda().coincidencias(search_term).subquery()
+        query = query.filter(Pedido.id.in_(db.select(coincidencias.c.pedido_id)))
+    return query
+
+def buscar_pedidos(texto, limite=BUSQUEDA_LIMITE):
+    coincidencias = motor_busqueda().coincidencias(texto).subquery()
+    return sesion_lectura().query(Pedido, coincidencias.c.rango) \
+        .join(coincidencias, Pedido.id == coincidencias.c.pedido_id) \
+        .order_by(coincidencias.c.rango.desc(), Pedido.fecha_creacion.desc()) \
+        .limit(limite).all()
+
+def _actualizar_busqueda(cambios):
+    borrados = []
+    documentos = []
+    for anterior, nuevo in cambios:
+        if nuevo is None:
+            borrados.append(anterior['id'])
+            continue
+        documento = documento_busqueda(nuevo)
+        if anterior is None or documento != documento_busqueda(anterior):
+            documentos.append((nuevo['id'], documento))
+    motor = motor_busqueda()
+    motor.borrar(borrados)
+    motor.guardar(documentos)
+
+@app.cli.command('reconstruir-busqueda')
+def reconstruir_busqueda():
+    """Regenera los documentos de búsqueda de todos los pedidos."""
+    motor = motor_busqueda()
+    columnas = [Pedido.id] + [getattr(Pedido, campo) for campo in CAMPOS_BUSQUEDA]
+    filas = db.session.execute(db.select(*columnas).execution_options(yield_per=1000))
+    total = 0
+    for lote in filas.partitions():
+        motor.guardar([(fila.id, documento_busqueda(fila._asdict())) for fila in lote])
+        total += len(lote)
+    marcar_cambio()
+    db.session.commit()
+    click.echo(f'Índice de búsqueda reconstruido ({total} pedidos).')
+
+# --- Paginación por cursor ---
+# Los tokens codifican (fecha_creacion, id) del último/primer pedido mostrado;
+# cualquier página cuesta lo mismo que la primera (sin OFFSET ni count()).
+def codificar_cursor(pedido):
+    valor = f'{pedido.fecha_creacion.isoformat()}|{pedido.id}'
+    return base64.urlsafe_b64encode(valor.encode('utf-8')).decode('ascii').rstrip('=')
+
+def decodificar_cursor(token):
+    try:
+        valor = base64.urlsafe_b64decode(token + '=' * (-len(token) % 4)).decode('utf-8')
+        fecha, pedido_id = valor.split('|')
+        return datetime.fromisoformat(fecha), int(pedido_id)
+    except (ValueError, binascii.Error):
+        abort(400, 'Cursor de paginación no válido.')
+
+def paginar_por_cursor(query, despues=None, antes=None, por_pagina=PEDIDOS_POR_PAGINA):
+    clave = db.tuple_(Pedido.fecha_creacion, Pedido.id)
+    if antes:
+        pedidos = query.filter(clave > decodificar_cursor(antes)) \
+            .order_by(Pedido.fecha_creacion.asc(), Pedido.id.asc()).limit(por_pagina + 1).all()
+        hay_anterior = len(pedidos) > por_pagina
+        pedidos = pedidos[:por_pagina][::-1]
+        hay_siguiente = True
+    else:
+        if despues:
+            query = query.filter(clave < decodificar_cursor(despues))
+        pedidos = query.order_by(Pedido.fecha_creacion.desc(), Pedido.id.desc()).limit(por_pagina + 1).all()
+        hay_siguiente = len(pedidos) > por_pagina
+        pedidos = pedidos[:por_pagina]
+        hay_anterior = bool(despues)
+
+    cursor_siguiente = codificar_cursor(pedidos[-1]) if pedidos and hay_siguiente else None
+    cursor_anterior = codificar_cursor(pedidos[0]) if pedidos and hay_anterior else None
+    return pedidos, cursor_siguiente, cursor_anterior
+
+def _leer_fecha(valor):
+    try:
+        return datetime.strptime(valor, '%Y-%m-%d')
+    except ValueError:
+        abort(400, f'Fecha no válida: {valor} (formato AAAA-MM-DD).')
+
+def filtrar_exportacion(query, args):
+    query = filtrar_busqueda(query, args.get('search', ''))
+    if args.get('desde'):
+        query = query.filter(Pedido.fecha_creacion >= _leer_fecha(args['desde']))
+    if args.get('hasta'):
+        query = query.filter(Pedido.fecha_creacion < _leer_fecha(args['hasta']) + timedelta(days=1))
+    if args.get('estado_pago'):
+        query = query.filter(Pedido.estado_pago == args['estado_pago'])
+    if args.get('estado_pedido'):
+        query = query.filter(Pedido.estado_pedido == args['estado_pedido'])
+    return query
+
+# --- Resumen del panel ---
+def _acumular_resumen(acumulado, datos, signo):
+    precio = datos['precio'] or 0.0
+    anticipo = datos['anticipo'] or 0.0
+    estado_pago = datos['estado_pago']
+
+    if estado_pago == 'Pagado Completo':
+        facturado = precio
+    elif estado_pago == 'Anticipo Pagado':
+        facturado = anticipo
+    else:
+        facturado = 0.0
+    pendiente = 0.0 if estado_pago == 'Pagado Completo' else precio - anticipo
+
+    def sumar(modelo, clave, **valores):
+        deltas = acumulado.setdefault((modelo, clave), {})
+        for columna, valor in valores.items():
+            deltas[columna] = deltas.get(columna, 0) + signo * valor
+
+    sumar(ResumenTotales, (('id', 1),), total_facturado=facturado, monto_pendiente=pendiente)
+    sumar(ResumenEstado, (('estado_pedido', datos['estado_pedido']),), cantidad=1)
+    fecha = datos['fecha_creacion']
+    if fecha:
+        if estado_pago == 'Pagado Completo':
+            sumar(ResumenMensual, (('mes', periodo_python(fecha, 'mes')),), ingresos=precio, cantidad=1)
+        sumar(ResumenDiario, (('fecha', periodo_python(fecha, 'dia')),), cantidad=1)
+        sumar(SerieDiaria, (('dia', fecha.date()), ('producto', datos['producto']),
+                            ('forma_contacto', datos['forma_contacto']), ('estado_pago', estado_pago)),
+              cantidad=1, importe=precio, anticipos=anticipo, pendiente=pendiente)
+
+# INSERT ... ON CONFLICT DO UPDATE: dos escrituras simultáneas que crean la
+# misma clave (primer pedido del día, del mes...) no chocan entre sí
+INSERTS_CON_CONFLICTO = {'postgresql': postgresql.insert, 'sqlite': sqlite.insert}
+
+def _aplicar_resumen(acumulado):
+    insertar = INSERTS_CON_CONFLICTO.get(db.engine.dialect.name)
+    for (modelo, clave), deltas in acumulado.items():
+        deltas = {columna: valor for columna, valor in deltas.items() if valor}
+        if not deltas:
+            continue
+        if insertar:
+            tabla = modelo.__table__
+            sentencia = insertar(tabla).values(**dict(clave), **deltas)
+            db.session.execute(sentencia.on_conflict_do_update(
+                index_elements=[columna for columna, _ in clave],
+                set_={columna: tabla.c[columna] + sentencia.excluded[columna] for columna in deltas}
+            ))
+            continue
+        actualizados = modelo.query.filter_by(**dict(clave)).update(
+            {getattr(modelo, columna): getattr(modelo, columna) + valor for columna, valor in deltas.items()},
+            synchronize_session=False
+        )
+        if not actualizados:
+            db.session.add(modelo(**dict(clave), **deltas))
+            db.session.flush()
+
+def registrar_cambios_pedidos(cambios):
+    # Punto único donde se propagan los cambios de pedidos a las estructuras
+    # derivadas. `cambios` es una lista de pares (anterior, nuevo) con dicts
+    # de datos_pedido() (None en altas y bajas). Debe llamarse antes del
+    # commit, en la misma transacción que la escritura de los pedidos.
+    acumulado = {}
+    for anterior, nuevo in cambios:
+        if anterior:
+            _acumular_resumen(acumulado, anterior, -1)
+        if nuevo:
+            _acumular_resumen(acumulado, nuevo, 1)
+    _aplicar_resumen(acumulado)
+    _actualizar_busqueda(cambios)
+    marcar_cambio()
+    return _deltas_resumen(acumulado)
+
+def marcar_cambio():
+    ahora = datetime.utcnow()
+    actualizados = VersionDatos.query.filter_by(id=1).update(
+        {VersionDatos.version: VersionDatos.version + 1, VersionDatos.modificado: ahora},
+        synchronize_session=False
+    )
+    if not actualizados:
+        db.session.add(VersionDatos(id=1, version=1, modificado=ahora))
+        db.session.flush()
+
+def registrar_cambio_pedido(anterior, nuevo):
+    return registrar_cambios_pedidos([(anterior, nuevo)])
+
+def _deltas_resumen(acumulado):
+    # Deltas del resumen en formato JSON para que el cliente actualice
+    # métricas y gráficos sin recargar la página
+    deltas = {'totales': {}, 'estados': {}, 'meses': {}, 'dias': {}}
+    for (modelo, clave), valores in acumulado.items():
+        valores = {columna: valor for columna, valor in valores.items() if valor}
+        if not valores:
+            continue
+        valor_clave = clave[0][1]
+        if modelo is ResumenTotales:
+            deltas['totales'] = valores
+        elif modelo is ResumenEstado:
+            deltas['estados'][valor_clave] = valores['cantidad']
+        elif modelo is ResumenMensual:
+            deltas['meses'][valor_clave] = valores
+        elif modelo is ResumenDiario:
+            deltas['dias'][valor_clave] = valores['cantidad']
+    return deltas
+
+def leer_totales():
+    sesion = sesion_lectura()
+    totales = sesion.get(ResumenTotales, 1)
+    total_pedidos = sesion.query(db.func.sum(ResumenEstado.cantidad)).scalar()
+    return {
+        'total_facturado': totales.total_facturado if totales else 0,
+        'monto_pendiente': totales.monto_pendiente if totales else 0.0,
+        'total_pedidos': total_pedidos or 0,
+    }
+
+def leer_graficos():
+    sesion = sesion_lectura()
+    estados = sesion.query(ResumenEstado).filter(ResumenEstado.cantidad > 0).order_by(ResumenEstado.estado_pedido).all()
+    meses = sesion.query(ResumenMensual).filter(ResumenMensual.cantidad > 0).order_by(ResumenMensual.mes).all()
+    return {
+        'chart_estados_data': {
+            'labels': [row.estado_pedido for row in estados],
+            'data': [row.cantidad for row in estados]
+        },
+        'chart_ingresos_data': {
+            'labels': [row.mes for row in meses],
+            'data': [row.ingresos for row in meses]
+        },
+    }
+
+def leer_dias_con_pedidos(desde, hasta):
+    # desde/hasta: 'YYYY-MM-DD', intervalo semiabierto [desde, hasta)
+    query = sesion_lectura().query(ResumenDiario).filter(ResumenDiario.cantidad > 0)
+    if desde:
+        query = query.filter(ResumenDiario.fecha >= desde)
+    if hasta:
+        query = query.filter(ResumenDiario.fecha < hasta)
+    return query.order_by(ResumenDiario.fecha).all()
+
+@app.cli.command('reconstruir-resumen')
+def reconstruir_resumen():
+    """Recalcula desde cero las tablas de resumen del panel."""
+    anticipo = db.func.coalesce(Pedido.anticipo, 0.0)
+    total_facturado, monto_pendiente = db.session.query(
+        db.func.sum(db.case(
+            (Pedido.estado_pago == 'Pagado Completo', Pedido.precio),
+            (Pedido.estado_pago == 'Anticipo Pagado', anticipo),
+            else_=0
+        )),
+        db.func.sum(db.case(
+            (Pedido.estado_pago != 'Pagado Completo', Pedido.precio - anticipo),
+            else_=0
+        ))
+    ).one()
+    estados = db.session.query(Pedido.estado_pedido, db.func.count(Pedido.id)).group_by(Pedido.estado_pedido).all()
+    mes = mes_de(Pedido.fecha_creacion)
+    meses = db.session.query(mes, db.func.sum(Pedido.precio), db.func.count(Pedido.id)) \
+        .filter(Pedido.estado_pago == 'Pagado Completo', Pedido.fecha_creacion.isnot(None)).group_by(mes).all()
+    dia = dia_de(Pedido.fecha_creacion)
+    dias = db.session.query(dia, db.func.count(Pedido.id)) \
+        .filter(Pedido.fecha_creacion.isnot(None)).group_by(dia).all()
+
+    for modelo in (ResumenTotales, ResumenEstado, ResumenMensual, ResumenDiario):
+        modelo.query.delete()
+    db.session.add(ResumenTotales(id=1, total_facturado=total_facturado or 0.0, monto_pendiente=monto_pendiente or 0.0))
+    db.session.add_all([ResumenEstado(estado_pedido=estado, cantidad=cantidad) for estado, cantidad in estados])
+    db.session.add_all([ResumenMensual(mes=m, ingresos=ingresos, cantidad=cantidad) for m, ingresos, cantidad in meses])
+    db.session.add_all([ResumenDiario(fecha=d, cantidad=cantidad) for d, cantidad in dias])
+    marcar_cambio()
+    db.session.commit()
+    click.echo(f'Resumen reconstruido ({len(estados)} estados, {len(meses)} meses, {len(dias)} días).')
+
+@app.cli.command('reconstruir-series')
+def reconstruir_series():
+    """Recalcula desde cero la serie diaria de los informes."""
+    anticipo = db.func.coalesce(Pedido.anticipo, 0.0)
+    dia = dia_de(Pedido.fecha_creacion)
+    dimensiones = (Pedido.producto, Pedido.forma_contacto, Pedido.estado_pago)
+    filas = db.session.query(
+        dia, *dimensiones,
+        db.func.count(Pedido.id),
+        db.func.sum(Pedido.precio),
+        db.func.sum(anticipo),
+        db.func.sum(db.case(
+            (Pedido.estado_pago != 'Pagado Completo', Pedido.precio - anticipo),
+            else_=0
+        ))
+    ).filter(Pedido.fecha_creacion.isnot(None)).group_by(dia, *dimensiones).all()
+
+    SerieDiaria.query.delete()
+    db.session.add_all([SerieDiaria(dia=datetime.strptime(d, '%Y-%m-%d').date(), producto=producto,
+                                    forma_contacto=forma_contacto, estado_pago=estado_pago, cantidad=cantidad,
+                                    importe=importe or 0.0, anticipos=anticipos or 0.0, pendiente=pendiente or 0.0)
+                        for d, producto, forma_contacto, estado_pago, cantidad, importe, anticipos, pendiente in filas])
+    marcar_cambio()
+    db.session.commit()
+    click.echo(f'Serie diaria reconstruida ({len(filas)} filas).')
+
+# Comandos que regeneran las estructuras derivadas tras una carga masiva
+# hecha por fuera de las rutas (p. ej. benchmark.py)
+COMANDOS_RECONSTRUCCION = ('reconstruir-resumen', 'reconstruir-series', 'reconstruir-busqueda')
+
+# --- Subida de imágenes en segundo plano ---
+# Las rutas guardan la imagen en static/uploads, hacen commit del pedido con
+# imagen_estado='pendiente' y un hilo del pool la sube al almacén con
+# reintentos. Los borrados se acumulan y se envían en lotes.
+SUBIDA_REINTENTOS = 3
+BORRADO_LOTE = 100  # máximo de delete_resources de Cloudinary
+
+class AlmacenCloudinary:
+    def subir(self, ruta):
+        return cloudinary.uploader.upload(ruta)['secure_url']
+
+    def borrar(self, urls):
+        cloudinary.api.delete_resources([url.split('/')[-1].rsplit('.', 1)[0] for url in urls])
+
+class AlmacenLocal:
+    # "Sube" copiando el archivo a static/uploads/almacen; no necesita red.
+    def subir(self, ruta):
+        destino = os.path.join(app.static_folder, 'uploads', 'almacen')
+        os.makedirs(destino, exist_ok=True)
+        nombre = os.path.basename(ruta)
+        shutil.copyfile(ruta, os.path.join(destino, nombre))
+        return f'{app.static_url_path}/uploads/almacen/{nombre}'
+
+    def borrar(self, urls):
+        for url in urls:
+            ruta = ruta_local_imagen(url)
+            if ruta and os.path.exists(ruta):
+                os.remove(ruta)
+
+ALMACENES_IMAGENES = {'cloudinary': AlmacenCloudinary, 'local': AlmacenLocal}
+
+def almacen_imagenes():
+    return ALMACENES_IMAGENES[app.config['ALMACEN_IMAGENES']]()
+
+ejecutor_imagenes = ThreadPoolExecutor(max_workers=app.config['SUBIDAS_HILOS'], thread_name_prefix='imagenes')
+
+def _programar_tarea(funcion, *args):
+    if app.config['SUBIDAS_SINCRONAS']:
+        funcion(*args)
+    else:
+        ejecutor_imagenes.submit(funcion, *args)
+
+def ruta_local_imagen(imagen_path):
+    prefijo = app.static_url_path + '/'
+    if imagen_path and imagen_path.startswith(prefijo):
+        return os.path.join(app.static_folder, imagen_path[len(prefijo):])
+    return None
+
+def guardar_imagen_temporal(file):
+    nombre = f'{uuid.uuid4().hex}-{secure_filename(file.filename)}'
+    os.makedirs(os.path.join(app.static_folder, 'uploads'), exist_ok=True)
+    file.save(os.path.join(app.static_folder, 'uploads', nombre))
+    # Sin url_for: imagen_path es una ruta de archivo, no debe llevar ?v=
+    return f'{app.static_url_path}/uploads/{nombre}'
+
+def _borrar_archivo_local(imagen_path):
+    ruta = ruta_local_imagen(imagen_path)
+    if ruta and os.path.exists(ruta):
+        os.remove(ruta)
+
+def _subir_imagen(pedido_id, imagen_path_local):
+    with app.app_context():
+        url = None
+        for intento in range(1, SUBIDA_REINTENTOS + 1):
+            try:
+                with medir_almacen('subir'):
+                    url = almacen_imagenes().subir(ruta_local_imagen(imagen_path_local))
+                break
+            except Exception:
+                app.logger.exception('Error al subir la imagen del pedido %s (intento %s de %s)',
+                                     pedido_id, intento, SUBIDA_REINTENTOS)
+                if intento < SUBIDA_REINTENTOS:
+                    time.sleep(2 ** intento)
+
+        derivadas = None
+        if not es_imagen_cloudinary(url):
+            derivadas = generar_derivadas(ruta_local_imagen(imagen_path_local))
+
+        pedido = db.session.get(Pedido, pedido_id)
+        if pedido is None or pedido.imagen_path != imagen_path_local:
+            # El pedido se borró o cambió de imagen mientras se subía
+            if url:
+                programar_borrado_imagenes([url])
+            _borrar_archivo_local(imagen_path_local)
+            return
+
+        anterior = datos_pedido(pedido)
+        if url:
+            pedido.imagen_path = url
+            pedido.imagen_estado = 'subida'
+        else:
+            pedido.imagen_estado = 'error'
+        pedido.imagen_derivadas = json.dumps(derivadas) if derivadas else None
+        registrar_cambio_pedido(anterior, datos_pedido(pedido))
+        db.session.commit()
+        if url:
+            _borrar_archivo_local(imagen_path_local)
+
+def programar_subida_imagen(pedido):
+    # Llamar después del commit del pedido
+    _programar_tarea(_subir_imagen, pedido.id, pedido.imagen_path)
+
+_borrados_pendientes = []
+_borrados_lock = threading.Lock()
+_borrado_programado = False
+
+def _vaciar_borrados():
+    global _borrado_programado
+    with _borrados_lock:
+        urls = list(_borrados_pendientes)
+        del _borrados_pendientes[:]
+        _borrado_programado = False
+    for inicio in range(0, len(urls), BORRADO_LOTE):
+        lote = urls[inicio:inicio + BORRADO_LOTE]
+        try:
+            with medir_almacen('borrar'):
+                almacen_imagenes().borrar(lote)
+        except Exception:
+            app.logger.exception('Error al borrar %s imágenes del almacén: %s', len(lote), lote)
+
+def programar_borrado_imagenes(urls):
+    global _borrado_programado
+    with _borrados_lock:
+        _borrados_pendientes.extend(urls)
+        if _borrado_programado:
+            return
+        _borrado_programado = True
+    _programar_tarea(_vaciar_borrados)
+
+def descartar_imagen(imagen_path, imagen_estado):
+    # Libera una imagen que el pedido ya no usa; llamar después del commit.
+    # Si la subida sigue pendiente, la tarea de subida se encarga del archivo;
+    # las URLs externas (importadas) no son nuestras y nunca se borran.
+    if not imagen_path or imagen_estado in ('pendiente', 'externa'):
+        return
+    if imagen_estado == 'error':
+        _borrar_archivo_local(imagen_path)
+    elif imagen_estado == 'subida' or imagen_path.startswith('http'):
+        programar_borrado_imagenes([imagen_path])
+
+# --- Miniaturas y derivadas de imagen ---
+# Las imágenes de Cloudinary se redimensionan con transformaciones en la URL;
+# las locales se generan con Pillow al procesar la subida y se guardan con
+# el hash de su contenido como nombre, así que se pueden cachear para siempre.
+VARIANTES_IMAGEN = {
+    'miniatura': ((100, 100), 'c_fill,w_100,h_100,f_auto,q_auto'),
+    'miniatura_2x': ((200, 200), 'c_fill,w_200,h_200,f_auto,q_auto'),
+    'mediana': ((800, 800), 'c_limit,w_800,h_800,f_auto,q_auto'),
+}
+CACHE_INMUTABLE = 365 * 24 * 3600
+
+def directorio_derivadas():
+    return os.path.join(app.static_folder, 'uploads', 'derivadas')
+
+def es_imagen_cloudinary(imagen_path):
+    return bool(imagen_path) and imagen_path.startswith('http') and '/image/upload/' in imagen_path
+
+def transformar_url_cloudinary(url, transformacion):
+    return url.replace('/image/upload/', f'/image/upload/{transformacion}/', 1)
+
+def generar_derivadas(ruta_original):
+    if Image is None or not ruta_original or not os.path.exists(ruta_original):
+        return {}
+    os.makedirs(directorio_derivadas(), exist_ok=True)
+    derivadas = {}
+    try:
+        with Image.open(ruta_original) as original:
+            original = ImageOps.exif_transpose(original)
+            if original.mode not in ('RGB', 'RGBA'):
+                original = original.convert('RGBA')
+            for variante, (tamano, _) in VARIANTES_IMAGEN.items():
+                if variante.startswith('miniatura'):
+                    imagen = ImageOps.fit(original, tamano)
+                else:
+                    imagen = original.copy()
+                    imagen.thumbnail(tamano)
+                buffer = io.BytesIO()
+                imagen.save(buffer, 'WEBP', quality=80)
+                datos = buffer.getvalue()
+                archivo = f'{hashlib.sha256(datos).hexdigest()[:24]}.webp'
+                ruta = os.path.join(directorio_derivadas(), archivo)
+                if not os.path.exists(ruta):
+                    with open(ruta, 'wb') as f:
+                        f.write(datos)
+                derivadas[variante] = archivo
+    except Exception:
+        app.logger.exception('Error al generar las derivadas de %s', ruta_original)
+        return {}
+    return derivadas
+
+@app.cli.command('generar-derivadas')
+@click.option('--limpiar', is_flag=True, help='Borra también las derivadas que ya no usa ningún pedido.')
+def generar_derivadas_cli(limpiar):
+    """Genera miniaturas para las imágenes locales que no las tienen."""
+    pedidos = Pedido.query.filter(Pedido.imagen_path.isnot(None), Pedido.imagen_derivadas.is_(None)).all()
+    generadas = 0
+    for pedido in pedidos:
+        derivadas = generar_derivadas(ruta_local_imagen(pedido.imagen_path))
+        if derivadas:
+            pedido.imagen_derivadas = json.dumps(derivadas)
+            generadas += 1
+    if generadas:
+        marcar_cambio()
+    db.session.commit()
+    click.echo(f'Derivadas generadas para {generadas} pedidos.')
+
+    if limpiar and os.path.isdir(directorio_derivadas()):
+        en_uso = set()
+        for (derivadas,) in db.session.query(Pedido.imagen_derivadas).filter(Pedido.imagen_derivadas.isnot(None)):
+            en_uso.update(json.loads(derivadas).values())
+        sobrantes = [archivo for archivo in os.listdir(directorio_derivadas()) if archivo not in en_uso]
+        for archivo in sobrantes:
+            os.remove(os.path.join(directorio_derivadas(), archivo))
+        click.echo(f'{len(sobrantes)} derivadas sin uso eliminadas.')
+
+@app.cli.command('reintentar-subidas')
+def reintentar_subidas():
+    """Vuelve a subir las imágenes pendientes o con error."""
+    pedidos = Pedido.query.filter(Pedido.imagen_estado.in_(['pendiente', 'error'])).all()
+    for pedido in pedidos:
+        if not os.path.exists(ruta_local_imagen(pedido.imagen_path) or ''):
+            click.echo(f'Pedido {pedido.id}: no se encuentra {pedido.imagen_path}')
+            continue
+        _subir_imagen(pedido.id, pedido.imagen_path)
+    click.echo(f'{len(pedidos)} imágenes procesadas.')
+
 # --- Rutas de la aplicación ---
 @app.route('/login', methods=['GET', 'POST'])
 def login():
@@ -110,99 +1077,493 @@ def logout():
     flash('Has cerrado sesión.', 'info')
     return redirect(url_for('login'))
 
+# --- Exportación en streaming ---
+# Las filas se leen por lotes (cursor del lado del servidor en PostgreSQL) y
+# se envían según se generan, sin materializar toda la tabla en memoria.
+def _filas_exportacion():
+    columnas = Pedido.__table__.columns
+    query = sesion_lectura().query(*columnas).order_by(Pedido.fecha_creacion.desc(), Pedido.id.desc())
+    query = filtrar_exportacion(query, request.args)
+    return query.execution_options(yield_per=EXPORTACION_LOTE)
+
+def _lotes_csv(filas):
+    output = io.StringIO()
+    writer = csv.writer(output)
+    writer.writerow([column.name for column in Pedido.__table__.columns])
+    for numero, fila in enumerate(filas, 1):
+        writer.writerow(fila)
+        if numero % EXPORTACION_LOTE == 0:
+            yield output.getvalue()
+            output.seek(0)
+            output.truncate()
+    yield output.getvalue()
+
+def _lotes_jsonl(filas):
+    lote = []
+    for fila in filas:
+        lote.append(json.dumps(fila._asdict(), default=str, ensure_ascii=False) + '\n')
+        if len(lote) == EXPORTACION_LOTE:
+            yield ''.join(lote)
+            lote = []
+    yield ''.join(lote)
+
+def _respuesta_exportacion(lotes, nombre_archivo, mimetype):
+    comprimir = request.args.get('gzip') == '1'
+
+    def generar():
+        compresor = zlib.compressobj(wbits=31) if comprimir else None  # wbits=31: formato gzip
+        for lote in lotes:
+            datos = lote.encode('utf-8')
+            if compresor:
+                datos = compresor.compress(datos)
+            if datos:
+                yield datos
+        if compresor:
+            yield compresor.flush()
+
+    response = Response(stream_with_context(generar()), mimetype=mimetype)
+    if comprimir:
+        nombre_archivo += '.gz'
+        response.headers["Content-type"] = "application/gzip"
+    response.headers["Content-Disposition"] = f"attachment; filename={nombre_archivo}"
+    return response
+
 @app.route('/export/csv')
 @login_required
 def export_csv():
-    pedidos = Pedido.query.order_by(Pedido.fecha_creacion.desc()).all()
-    output = io.StringIO()
-    writer = csv.writer(output)
-    
-    # Obtener los nombres de las columnas del modelo Pedido
-    header = [column.name for column in Pedido.__table__.columns]
-    writer.writerow(header)
-    
-    for pedido in pedidos:
-        writer.writerow([getattr(pedido, col) for col in header])
-    
-    output.seek(0)
-    response = make_response(output.getvalue())
-    response.headers["Content-Disposition"] = "attachment; filename=pedidos.csv"
-    response.headers["Content-type"] = "text/csv"
+    return _respuesta_exportacion(_lotes_csv(_filas_exportacion()), 'pedidos.csv', 'text/csv')
+
+@app.route('/export/jsonl')
+@login_required
+def export_jsonl():
+    return _respuesta_exportacion(_lotes_jsonl(_filas_exportacion()), 'pedidos.jsonl', 'application/x-ndjson')
+
+@app.route('/imagenes/<nombre>')
+def imagen_derivada(nombre):
+    # El nombre es el hash del contenido: la respuesta nunca cambia
+    response = send_from_directory(directorio_derivadas(), nombre, max_age=CACHE_INMUTABLE,
+                                   etag=nombre.rsplit('.', 1)[0])
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+# --- Caché de estáticos, service worker y GET condicionales ---
+# url_for('static', ...) añade ?v=<huella del contenido>; con esa huella el
+# archivo se sirve con caché de un año, y cambia de URL en cuanto cambia.
+# Los recursos del CDN ya llevan versión en la URL (menos Chart.js).
+ESTATICOS_APP_SHELL = ('css/style.css', 'js/script.js', 'manifest.json', 'img/logo_kRGB.png',
+                       'img/IMG_2804.jpg', 'img/IMG_2832.jpg', 'img/IMG_3158.JPG')
+RECURSOS_CDN = (
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/css/bootstrap.min.css',
+    'https://cdn.jsdelivr.net/npm/bootstrap@5.3.0/dist/js/bootstrap.bundle.min.js',
+    'https://cdn.jsdelivr.net/npm/fullcalendar@5.11.3/main.min.css',
+    'https://cdn.jsdelivr.net/npm/fullcalendar@5.11.3/main.min.js',
+    'https://cdn.jsdelivr.net/npm/fullcalendar@5.11.3/locales/es.js',
+    'https://cdn.jsdelivr.net/npm/chart.js',
+)
+_huellas_estaticos = {}
+
+def huella_estatico(filename):
+    ruta = os.path.join(app.static_folder, filename)
+    try:
+        modificado = os.path.getmtime(ruta)
+    except OSError:
+        return None
+    guardada = _huellas_estaticos.get(filename)
+    if guardada and guardada[0] == modificado:
+        return guardada[1]
+    with open(ruta, 'rb') as f:
+        huella = hashlib.sha256(f.read()).hexdigest()[:12]
+    _huellas_estaticos[filename] = (modificado, huella)
+    return huella
+
+@app.url_defaults
+def _versionar_estaticos(endpoint, values):
+    # uploads/ son datos de los pedidos, no recursos de la aplicación
+    if endpoint == 'static' and 'v' not in values and not values.get('filename', '').startswith('uploads/'):
+        huella = huella_estatico(values.get('filename', ''))
+        if huella:
+            values['v'] = huella
+
+@app.after_request
+def _cachear_estaticos(response):
+    if request.endpoint == 'static' and response.status_code in (200, 304) \
+            and request.args.get('v') == huella_estatico(request.view_args['filename']):
+        response.cache_control.max_age = CACHE_INMUTABLE
+        response.cache_control.public = True
+        response.cache_control.immutable = True
+        response.cache_control.no_cache = None
     return response
 
+def huella_aplicacion():
+    # Cambia con cada despliegue que toque plantillas o estáticos, para que
+    # una página en caché no sobreviva a un cambio de HTML o de script.js
+    entradas = []
+    for raiz in (app.template_folder, app.static_folder):
+        raiz = os.path.join(app.root_path, raiz)
+        for directorio, subdirectorios, archivos in os.walk(raiz):
+            # Las subidas de los pedidos no son parte de la aplicación; se
+            # podan aquí para que os.walk ni siquiera entre en ellas
+            subdirectorios[:] = [d for d in subdirectorios if d != 'uploads']
+            for archivo in archivos:
+                ruta = os.path.join(directorio, archivo)
+                entradas.append(f'{os.path.relpath(ruta, raiz)}:{os.path.getmtime(ruta)}')
+    resumen = hashlib.sha256()
+    for entrada in sorted(entradas):
+        resumen.update(entrada.encode())
+    return resumen.hexdigest()[:12]
+
+HUELLA_APLICACION = huella_aplicacion()
+
+def recursos_app_shell():
+    return [url_for('static', filename=filename) for filename in ESTATICOS_APP_SHELL] + list(RECURSOS_CDN)
+
+@app.route('/service-worker.js')
+def service_worker():
+    # Se sirve desde la raíz para que su ámbito cubra toda la aplicación
+    recursos = recursos_app_shell()
+    version = hashlib.sha256(json.dumps([HUELLA_APLICACION] + recursos).encode()).hexdigest()[:12]
+    response = make_response(render_template('service-worker.js', version=version, recursos=recursos))
+    response.mimetype = 'application/javascript'
+    response.cache_control.no_cache = True
+    return response
+
+def etiqueta_datos():
+    # ETag y Last-Modified de los datos; con réplica se combinan las dos
+    # versiones, porque parte de cada vista sale de cada una
+    sesiones = [db.session] if sesion_lectura() is db.session else [db.session, sesion_lectura()]
+    versiones = [sesion.get(VersionDatos, 1) for sesion in sesiones]
+    etag = '-'.join([HUELLA_APLICACION, str(current_user.get_id())] +
+                    [str(version.version if version else 0) for version in versiones])
+    modificado = max((version.modificado for version in versiones if version), default=None)
+    return etag, modificado
+
+def condicional(vista):
+    # Responde 304 sin consultar ni renderizar si el cliente ya tiene la
+    # versión actual de los datos (If-None-Match / If-Modified-Since)
+    @functools.wraps(vista)
+    def envoltura(*args, **kwargs):
+        if '_flashes' in session:
+            # Hay avisos pendientes: la página no depende solo de los datos
+            return vista(*args, **kwargs)
+        etag, modificado = etiqueta_datos()
+        if not is_resource_modified(request.environ, etag=etag, last_modified=modificado):
+            response = Response(status=304)
+        else:
+            response = make_response(vista(*args, **kwargs))
+        response.set_etag(etag)
+        if modificado:
+            response.last_modified = modificado
+        if not response.cache_control.max_age:
+            response.cache_control.private = True
+            response.cache_control.no_cache = True
+        return response
+    return envoltura
+
+@app.route('/api/buscar')
+@login_required
+@condicional
+def api_buscar():
+    texto = request.args.get('q', '').strip()
+    limite = max(1, min(request.args.get('limite', BUSQUEDA_LIMITE, type=int), 50))
+    if not texto:
+        return jsonify([])
+    return jsonify([{
+        'id': pedido.id,
+        'nombre_cliente': pedido.nombre_cliente,
+        'producto': pedido.producto,
+        'estado_pedido': pedido.estado_pedido,
+        'fecha_creacion': pedido.fecha_creacion.isoformat() if pedido.fecha_creacion else None,
+        'rango': rango
+    } for pedido, rango in buscar_pedidos(texto, limite)])
+
+@app.route('/api/graficos')
+@login_required
+@condicional
+def api_graficos():
+    # Sin max-age: condicional() marca no-cache y revalida con el ETag, así
+    # que tras una escritura nunca se sirve una copia antigua
+    return jsonify(leer_graficos())
+
+@app.route('/api/calendario')
+@login_required
+@condicional
+def api_calendario():
+    # Feed de eventos de FullCalendar: recibe start/end (ISO 8601) y
+    # devuelve un evento de fondo por día con pedidos en esa ventana.
+    desde = request.args.get('start', '')[:10]
+    hasta = request.args.get('end', '')[:10]
+    for valor in (desde, hasta):
+        if valor:
+            _leer_fecha(valor)
+    return jsonify([{
+        'start': dia.fecha,
+        'display': 'background',
+        'classNames': ['event-day'],
+        'extendedProps': {'cantidad': dia.cantidad}
+    } for dia in leer_dias_con_pedidos(desde, hasta)])
+
+# Dimensiones por las que se puede desglosar /api/informes
+DIMENSIONES_INFORME = ('producto', 'forma_contacto', 'estado_pago')
+
+@app.route('/api/informes')
+@login_required
+@condicional
+def api_informes():
+    # Agrega SerieDiaria por periodo (?granularidad=dia|semana|mes) y las
+    # dimensiones de ?agrupar=producto,forma_contacto; ?desde/?hasta
+    # (AAAA-MM-DD, ambos incluidos) y ?producto= etc. filtran.
+    granularidad = request.args.get('granularidad', 'semana')
+    if granularidad not in PERIODOS_FECHA:
+        abort(400, f'Granularidad no válida: {granularidad} (dia, semana o mes).')
+    agrupar = [d for d in request.args.get('agrupar', 'producto').split(',') if d]
+    for dimension in agrupar:
+        if dimension not in DIMENSIONES_INFORME:
+            abort(400, f'Dimensión no válida: {dimension}.')
+
+    periodo = PERIODOS_FECHA[granularidad](SerieDiaria.dia).label('periodo')
+    columnas = [getattr(SerieDiaria, dimension) for dimension in agrupar]
+    cantidad = db.func.sum(SerieDiaria.cantidad)
+    query = sesion_lectura().query(
+        periodo, *columnas, cantidad.label('cantidad'),
+        db.func.sum(SerieDiaria.importe).label('importe'),
+        db.func.sum(SerieDiaria.anticipos).label('anticipos'),
+        db.func.sum(SerieDiaria.pendiente).label('pendiente'),
+    )
+    if request.args.get('desde'):
+        query = query.filter(SerieDiaria.dia >= _leer_fecha(request.args['desde']).date())
+    if request.args.get('hasta'):
+        query = query.filter(SerieDiaria.dia <= _leer_fecha(request.args['hasta']).date())
+    for dimension in DIMENSIONES_INFORME:
+        if request.args.get(dimension):
+            query = query.filter(getattr(SerieDiaria, dimension) == request.args[dimension])
+    filas = query.group_by(periodo, *columnas).having(cantidad > 0).order_by(periodo, *columnas).all()
+
+    return jsonify({
+        'granularidad': granularidad,
+        'agrupar': agrupar,
+        'filas': [fila._asdict() for fila in filas],
+    })
+
 @app.route('/')
 @login_required
+@condicional
 def index():
-    page = request.args.get('page', 1, type=int)
     search_term = request.args.get('search', '')
     
-    query = Pedido.query
-
-    if search_term:
-        query = query.filter(
-            (Pedido.nombre_cliente.ilike(f'%{search_term}%')) |
-            (Pedido.producto.ilike(f'%{search_term}%')) |
-            (Pedido.estado_pedido.ilike(f'%{search_term}%'))
-        )
-
-    total_pedidos = query.count()
-    total_paginas = math.ceil(total_pedidos / PEDIDOS_POR_PAGINA)
-    
-    pedidos = query.order_by(Pedido.fecha_creacion.desc())
-    pedidos = pedidos.paginate(page=page, per_page=PEDIDOS_POR_PAGINA, error_out=False).items
+    # El listado normal sale de la base principal para que un pedido recién
+    # guardado aparezca al volver; las búsquedas pueden ir a la réplica.
+    query = filtrar_busqueda(sesion_lectura().query(Pedido) if search_term else Pedido.query, search_term)
+    pedidos, cursor_siguiente, cursor_anterior = paginar_por_cursor(
+        query, despues=request.args.get('despues'), antes=request.args.get('antes'))
     
-    total_facturado_result = db.session.query(
-        db.func.sum(db.case(
-            (Pedido.estado_pago == 'Pagado Completo', Pedido.precio),
-            else_=0
-        )) +
-        db.func.sum(db.case(
-            (Pedido.estado_pago == 'Anticipo Pagado', Pedido.anticipo),
-            else_=0
-        ))
-    ).scalar()
-    total_facturado = total_facturado_result or 0
-
-    monto_pendiente_result = db.session.query(
-        db.func.sum(Pedido.precio - Pedido.anticipo)
-    ).filter(Pedido.estado_pago != 'Pagado Completo').scalar()
-    monto_pendiente = monto_pendiente_result or 0.0
-
-    estados_result = db.session.query(Pedido.estado_pedido, db.func.count(Pedido.id)).group_by(Pedido.estado_pedido).all()
-    chart_estados_data = {
-        'labels': [row[0] for row in estados_result],
-        'data': [row[1] for row in estados_result]
-    }
-
-    # CORRECCIÓN: Usar TO_CHAR para PostgreSQL y la expresión completa en group_by y order_by
-    ingresos_mensuales_expr = db.func.to_char(Pedido.fecha_creacion, 'YYYY-MM')
-    ingresos_mensuales_result = db.session.query(
-        ingresos_mensuales_expr,
-        db.func.sum(Pedido.precio)
-    ).filter(Pedido.estado_pago == 'Pagado Completo').group_by(ingresos_mensuales_expr).order_by(ingresos_mensuales_expr).all()
-    chart_ingresos_data = {
-        'labels': [row[0] for row in ingresos_mensuales_result],
-        'data': [row[1] for row in ingresos_mensuales_result]
-    }
+    totales = leer_totales()
 
-    # CORRECCIÓN: Usar TO_CHAR para PostgreSQL y la expresión completa en order_by
-    fechas_unicas_expr = db.func.to_char(Pedido.fecha_creacion, 'YYYY-MM-DD')
-    fechas_unicas_result = db.session.query(
-        fechas_unicas_expr
-    ).distinct().order_by(fechas_unicas_expr).all()
-    fechas_unicas = [row[0] for row in fechas_unicas_result]
+    # Sin búsqueda el total sale gratis de la tabla de resumen; con búsqueda
+    # no se cuenta (sería un recorrido completo de los resultados).
+    total_pedidos = None if search_term else totales['total_pedidos']
 
+    # Los gráficos y el calendario se cargan después desde /api/graficos y
+    # /api/calendario, así que la página no crece con el histórico.
     return render_template('index.html', 
                            pedidos=pedidos, 
-                           fechas_pedidos_json=json.dumps(fechas_unicas),
-                           total_facturado=total_facturado,
-                           monto_pendiente=monto_pendiente,
-                           chart_estados_data=json.dumps(chart_estados_data),
-                           chart_ingresos_data=json.dumps(chart_ingresos_data),
-                           page=page,
-                           total_paginas=total_paginas,
+                           total_facturado=totales['total_facturado'],
+                           monto_pendiente=totales['monto_pendiente'],
+                           cursor_siguiente=cursor_siguiente,
+                           cursor_anterior=cursor_anterior,
+                           total_pedidos=total_pedidos,
+                           por_pagina=PEDIDOS_POR_PAGINA,
                            search_term=search_term)
 
+# --- Respuestas JSON para escrituras vía fetch ---
+# Las rutas de escritura responden con la fila cambiada y los deltas del
+# resumen cuando el cliente pide JSON; si no, siguen redirigiendo a index().
+def quiere_json():
+    return request.is_json or request.accept_mimetypes.best == 'application/json'
+
+def avisar(mensaje, categoria):
+    if quiere_json():
+        g.setdefault('avisos', []).append({'mensaje': mensaje, 'categoria': categoria})
+    else:
+        flash(mensaje, categoria)
+
+def responder_errores(errors):
+    if quiere_json():
+        return jsonify({'errores': errors}), 400
+    for error in errors: flash(error, 'danger')
+    return redirect(url_for('index'))
+
+def responder_escritura(mensaje, categoria, deltas, pedido=None, eliminado=None):
+    if not quiere_json():
+        flash(mensaje, categoria)
+        return redirect(url_for('index'))
+    avisar(mensaje, categoria)
+    return jsonify({
+        'id': pedido.id if pedido else eliminado,
+        'fila_html': render_template('_fila_pedido.html', pedido=pedido) if pedido else None,
+        'eliminado': eliminado is not None,
+        'deltas': deltas,
+        'avisos': g.get('avisos', []),
+    })
+
+# --- Importación y acciones masivas ---
+# Mismo formato de columnas que export_csv; id, estado_pago y los campos de
+# imagen interna se ignoran (estado_pago se deriva como en add_pedido).
+def _lista_de_filas(filas):
+    if not isinstance(filas, list):
+        abort(400, 'El JSON debe ser una lista de pedidos.')
+    return filas
+
+def _leer_filas_importacion():
+    if request.is_json:
+        return _lista_de_filas(request.get_json())
+    archivo = request.files.get('archivo')
+    if not archivo or archivo.filename == '':
+        abort(400, 'No se ha enviado ningún archivo.')
+    contenido = io.TextIOWrapper(archivo.stream, encoding='utf-8-sig')
+    extension = archivo.filename.rsplit('.', 1)[-1].lower()
+    if extension == 'json':
+        return _lista_de_filas(json.load(contenido))
+    if extension == 'jsonl':
+        return [json.loads(linea) for linea in contenido if linea.strip()]
+    return csv.DictReader(contenido)
+
+def _pedido_desde_fila(fila):
+    def texto(campo):
+        return str(fila.get(campo) or '').strip()
+
+    try:
+        precio = float(fila.get('precio') or 0)
+        anticipo = float(fila.get('anticipo') or 0)
+    except (TypeError, ValueError):
+        return None, ['Precio o anticipo no numérico.']
+    errors = validar_pedido(texto('nombre_cliente'), texto('forma_contacto'), texto('producto'), precio, anticipo,
+                            contacto_detalle=texto('contacto_detalle'),
+                            direccion_entrega=texto('direccion_entrega'),
+                            imagen_path=texto('imagen_path'))
+
+    estado_pedido = texto('estado_pedido') or 'Pendiente'
+    if estado_pedido not in ESTADOS_PEDIDO:
+        errors.append(f'Estado de pedido no válido: {estado_pedido}.')
+    fecha_creacion = None
+    if texto('fecha_creacion'):
+        try:
+            fecha_creacion = datetime.fromisoformat(texto('fecha_creacion'))
+        except ValueError:
+            errors.append(f'Fecha no válida: {texto("fecha_creacion")}.')
+    if errors:
+        return None, errors
+
+    if estado_pedido == 'Completado':
+        anticipo = precio
+    # Una URL importada puede ser la imagen de otro pedido o de otra cuenta:
+    # se enlaza como 'externa' para que borrar este pedido no la borre
+    imagen_path = texto('imagen_path') if texto('imagen_path').startswith('http') else None
+    return Pedido(
+        nombre_cliente=texto('nombre_cliente'),
+        forma_contacto=texto('forma_contacto'),
+        contacto_detalle=texto('contacto_detalle'),
+        direccion_entrega=texto('direccion_entrega'),
+        producto=texto('producto'),
+        detalles=texto('detalles'),
+        precio=precio,
+        anticipo=anticipo,
+        imagen_path=imagen_path,
+        imagen_estado='externa' if imagen_path else None,
+        estado_pago=calcular_estado_pago(precio, anticipo),
+        estado_pedido=estado_pedido,
+        fecha_creacion=fecha_creacion or datetime.utcnow()
+    ), []
+
+def _insertar_lote(pedidos):
+    db.session.add_all(pedidos)
+    db.session.flush()
+    registrar_cambios_pedidos([(None, datos_pedido(pedido)) for pedido in pedidos])
+
+def _responder_masivo(informe, mensaje):
+    if quiere_json():
+        return jsonify(informe)
+    flash(mensaje, 'success' if not informe['errores'] else 'warning')
+    for error in informe['errores'][:5]:
+        flash(f"Fila {error['fila']}: {' '.join(error['errores'])}", 'danger')
+    return redirect(url_for('index'))
+
+@app.route('/import_pedidos', methods=['POST'])
+@login_required
+def import_pedidos():
+    errores = []
+    lote = []
+    insertados = 0
+    try:
+        for numero, fila in enumerate(_leer_filas_importacion(), 1):
+            if not isinstance(fila, dict):
+                errores.append({'fila': numero, 'errores': ['La fila no es un objeto.']})
+                continue
+            pedido, errores_fila = _pedido_desde_fila(fila)
+            if errores_fila:
+                errores.append({'fila': numero, 'errores': errores_fila})
+                continue
+            lote.append(pedido)
+            if len(lote) == IMPORTACION_LOTE:
+                _insertar_lote(lote)
+                insertados += len(lote)
+                lote = []
+    except (ValueError, csv.Error) as e:
+        db.session.rollback()
+        abort(400, f'No se pudo leer el archivo: {e}')
+    if lote:
+        _insertar_lote(lote)
+        insertados += len(lote)
+    db.session.commit()
+    return _responder_masivo({'insertados': insertados, 'errores': errores},
+                             f'{insertados} pedidos importados, {len(errores)} filas con errores.')
+
+@app.route('/bulk_estado', methods=['POST'])
+@login_required
+def bulk_estado():
+    if request.is_json:
+        datos = request.get_json()
+        if not isinstance(datos, dict) or not isinstance(datos.get('ids', []), list):
+            abort(400, 'Se esperaba un objeto JSON con una lista "ids".')
+        ids = datos.get('ids', [])
+        estado_pedido = datos.get('estado_pedido')
+    else:
+        ids = request.form.getlist('ids')
+        estado_pedido = request.form.get('estado_pedido')
+    if estado_pedido not in ESTADOS_PEDIDO:
+        abort(400, f'Estado de pedido no válido: {estado_pedido}.')
+
+    errores = []
+    ids_validos = set()
+    for valor in ids:
+        try:
+            ids_validos.add(int(valor))
+        except (TypeError, ValueError):
+            errores.append({'fila': valor, 'errores': ['Id no válido.']})
+
+    columnas = Pedido.__table__.columns
+    anteriores = {fila.id: fila._asdict() for fila in
+                  db.session.query(*columnas).filter(Pedido.id.in_(ids_validos))}
+    errores += [{'fila': pedido_id, 'errores': ['El pedido no existe.']}
+                for pedido_id in sorted(ids_validos - anteriores.keys())]
+
+    valores = {Pedido.estado_pedido: estado_pedido}
+    if estado_pedido == 'Completado':
+        valores.update({Pedido.anticipo: Pedido.precio, Pedido.estado_pago: 'Pagado Completo'})
+    cambios = []
+    for anterior in anteriores.values():
+        nuevo = dict(anterior, estado_pedido=estado_pedido)
+        if estado_pedido == 'Completado':
+            nuevo.update(anticipo=anterior['precio'], estado_pago='Pagado Completo')
+        cambios.append((anterior, nuevo))
+
+    if anteriores:
+        Pedido.query.filter(Pedido.id.in_(anteriores.keys())).update(valores, synchronize_session=False)
+        registrar_cambios_pedidos(cambios)
+    db.session.commit()
+    return _responder_masivo({'actualizados': len(anteriores), 'errores': errores},
+                             f'{len(anteriores)} pedidos marcados como "{estado_pedido}".')
+
 @app.route('/add_pedido', methods=['POST'])
 @login_required
 def add_pedido():
@@ -216,38 +1577,22 @@ def add_pedido():
         precio = float(request.form['precio'])
         anticipo = float(request.form.get('anticipo', '0.0'))
         
-        errors = []
-        if not nombre_cliente: errors.append('El nombre del cliente es obligatorio.')
-        if not forma_contacto: errors.append('La forma de contacto es obligatoria.')
-        if not producto: errors.append('El producto es obligatorio.')
-
-        if precio <= 0: errors.append('El precio debe ser un número positivo.')
-        if anticipo < 0: errors.append('El anticipo no puede ser negativo.')
-        if anticipo > precio: errors.append('El anticipo no puede ser mayor que el precio total.')
+        errors = validar_pedido(nombre_cliente, forma_contacto, producto, precio, anticipo,
+                                contacto_detalle=contacto_detalle, direccion_entrega=direccion_entrega)
 
         if errors:
-            for error in errors: flash(error, 'danger')
-            return redirect(url_for('index'))
+            return responder_errores(errors)
 
-        if anticipo == precio:
-            estado_pago = 'Pagado Completo'
-        elif anticipo > 0:
-            estado_pago = 'Anticipo Pagado'
-        else:
-            estado_pago = 'Pendiente'
-        
+        estado_pago = calcular_estado_pago(precio, anticipo)
         estado_pedido = 'Pendiente'
         imagen_path = None
+        imagen_estado = None
 
         if 'imagen' in request.files:
             file = request.files['imagen']
             if file.filename != '' and allowed_file(file.filename):
-                try:
-                    upload_result = cloudinary.uploader.upload(file)
-                    imagen_path = upload_result['secure_url']
-                except Exception as e:
-                    flash(f'Error al subir la imagen a Cloudinary: {e}', 'danger')
-                    imagen_path = None
+                imagen_path = guardar_imagen_temporal(file)
+                imagen_estado = 'pendiente'
 
         nuevo_pedido = Pedido(
             nombre_cliente=nombre_cliente,
@@ -259,13 +1604,17 @@ def add_pedido():
             precio=precio,
             anticipo=anticipo,
             imagen_path=imagen_path,
+            imagen_estado=imagen_estado,
             estado_pago=estado_pago,
             estado_pedido=estado_pedido
         )
         db.session.add(nuevo_pedido)
+        db.session.flush()
+        deltas = registrar_cambio_pedido(None, datos_pedido(nuevo_pedido))
         db.session.commit()
-        flash('¡Pedido añadido con éxito!', 'success')
-        return redirect(url_for('index'))
+        if imagen_estado == 'pendiente':
+            programar_subida_imagen(nuevo_pedido)
+        return responder_escritura('¡Pedido añadido con éxito!', 'success', deltas, pedido=nuevo_pedido)
 
 @app.route('/update_pedido/<int:id>', methods=['POST'])
 @login_required
@@ -282,51 +1631,32 @@ def update_pedido(id):
     anticipo = float(request.form.get('anticipo', '0.0'))
     estado_pedido = request.form['estado_pedido']
 
-    errors = []
-    if not nombre_cliente: errors.append('El nombre del cliente es obligatorio.')
-    if not forma_contacto: errors.append('La forma de contacto es obligatoria.')
-    if not producto: errors.append('El producto es obligatorio.')
-    if precio <= 0: errors.append('El precio debe ser un número positivo.')
-    if anticipo < 0: errors.append('El anticipo no puede ser negativo.')
-    if anticipo > precio: errors.append('El anticipo no puede ser mayor que el precio total.')
+    errors = validar_pedido(nombre_cliente, forma_contacto, producto, precio, anticipo,
+                            contacto_detalle=contacto_detalle, direccion_entrega=direccion_entrega)
 
     if errors:
-        for error in errors: flash(error, 'danger')
-        return redirect(url_for('index'))
+        return responder_errores(errors)
 
     if estado_pedido == 'Completado':
         anticipo = precio
         estado_pago = 'Pagado Completo'
     else:
-        if anticipo == precio:
-            estado_pago = 'Pagado Completo'
-        elif anticipo > 0:
-            estado_pago = 'Anticipo Pagado'
-        else:
-            estado_pago = 'Pendiente'
+        estado_pago = calcular_estado_pago(precio, anticipo)
 
     # Lógica de la imagen
     imagen_path = pedido.imagen_path # Mantener la imagen existente por defecto
+    imagen_estado = pedido.imagen_estado
     if 'imagen' in request.files and request.files['imagen'].filename != '':
         file = request.files['imagen']
         if allowed_file(file.filename):
-            try:
-                # Borrar imagen antigua de Cloudinary si existe
-                if imagen_path and imagen_path.startswith('http'):
-                    public_id = imagen_path.split('/')[-1].rsplit('.', 1)[0]
-                    cloudinary.uploader.destroy(public_id)
-                
-                # Subir nueva imagen a Cloudinary
-                upload_result = cloudinary.uploader.upload(file)
-                imagen_path = upload_result['secure_url']
-                flash('Imagen actualizada en Cloudinary.', 'success')
-            except Exception as e:
-                print(f"ERROR CLOUDINARY: {e}")
-                flash(f'Error al subir a Cloudinary: {e}', 'danger')
+            imagen_path = guardar_imagen_temporal(file)
+            imagen_estado = 'pendiente'
+            avisar('Imagen recibida; se subirá en segundo plano.', 'success')
         else:
-            flash('Formato de archivo no permitido.', 'warning')
+            avisar('Formato de archivo no permitido.', 'warning')
 
     # Actualizar el objeto pedido con los nuevos datos
+    anterior = datos_pedido(pedido)
     pedido.nombre_cliente = nombre_cliente
     pedido.forma_contacto = forma_contacto
     pedido.contacto_detalle = contacto_detalle
@@ -335,31 +1665,31 @@ def update_pedido(id):
     pedido.detalles = detalles
     pedido.precio = precio
     pedido.anticipo = anticipo
+    if imagen_path != pedido.imagen_path:
+        pedido.imagen_derivadas = None
     pedido.imagen_path = imagen_path
+    pedido.imagen_estado = imagen_estado
     pedido.estado_pago = estado_pago
     pedido.estado_pedido = estado_pedido
 
+    deltas = registrar_cambio_pedido(anterior, datos_pedido(pedido))
     db.session.commit()
-    flash('¡Pedido actualizado correctamente!', 'success')
-    return redirect(url_for('index'))
+    if imagen_path != anterior['imagen_path']:
+        descartar_imagen(anterior['imagen_path'], anterior['imagen_estado'])
+        programar_subida_imagen(pedido)
+    return responder_escritura('¡Pedido actualizado correctamente!', 'success', deltas, pedido=pedido)
 
 @app.route('/delete_pedido/<int:id>', methods=['POST'])
 @login_required
 def delete_pedido(id):
     pedido = Pedido.query.get_or_404(id)
-    
-    # Borrar imagen de Cloudinary si existe
-    if pedido.imagen_path and pedido.imagen_path.startswith('http'):
-        try:
-            public_id = pedido.imagen_path.split('/')[-1].rsplit('.', 1)[0]
-            cloudinary.uploader.destroy(public_id)
-        except Exception as e:
-            print(f"Error deleting image from Cloudinary: {e}")
+    anterior = datos_pedido(pedido)
 
+    deltas = registrar_cambio_pedido(anterior, None)
     db.session.delete(pedido)
     db.session.commit()
-    flash('Pedido eliminado.', 'danger')
-    return redirect(url_for('index'))
+    descartar_imagen(anterior['imagen_path'], anterior['imagen_estado'])
+    return responder_escritura('Pedido eliminado.', 'danger', deltas, eliminado=id)
 
 if __name__ == '__main__':
     app.run(debug=True)
\ No newline at end of file
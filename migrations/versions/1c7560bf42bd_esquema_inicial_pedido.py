@@ -0,0 +1,43 @@
+"""esquema inicial: tabla pedido
+
+Revision ID: 1c7560bf42bd
+Revises: 
+Create Date: 2026-10-18 10:00:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '1c7560bf42bd'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    # Las bases de datos existentes ya tienen la tabla (creada con
+    # db.create_all() antes de usar migraciones); solo se crea si falta.
+    if sa.inspect(op.get_bind()).has_table('pedido'):
+        return
+    op.create_table('pedido',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('nombre_cliente', sa.String(length=100), nullable=False),
+    sa.Column('forma_contacto', sa.String(length=50), nullable=False),
+    sa.Column('contacto_detalle', sa.String(length=100), nullable=True),
+    sa.Column('direccion_entrega', sa.String(length=200), nullable=True),
+    sa.Column('producto', sa.String(length=100), nullable=False),
+    sa.Column('detalles', sa.Text(), nullable=True),
+    sa.Column('precio', sa.Float(), nullable=False),
+    sa.Column('anticipo', sa.Float(), nullable=True),
+    sa.Column('imagen_path', sa.String(length=255), nullable=True),
+    sa.Column('estado_pago', sa.String(length=50), nullable=False),
+    sa.Column('estado_pedido', sa.String(length=50), nullable=False),
+    sa.Column('fecha_creacion', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+
+
+def downgrade():
+    op.drop_table('pedido')
@@ -0,0 +1,32 @@
+"""contador de cambios
+
+Revision ID: 259e35c2dd86
+Revises: a44aed6c184f
+Create Date: 2026-10-18 10:55:00.000000
+
+"""
+from datetime import datetime
+
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '259e35c2dd86'
+down_revision = 'a44aed6c184f'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    version_datos = op.create_table('version_datos',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('version', sa.Integer(), nullable=False),
+    sa.Column('modificado', sa.DateTime(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.bulk_insert(version_datos, [{'id': 1, 'version': 0, 'modificado': datetime.utcnow()}])
+
+
+def downgrade():
+    op.drop_table('version_datos')
@@ -0,0 +1,45 @@
+"""indice de busqueda de pedidos (tsvector/pg_trgm o FTS5)
+
+Revision ID: 4da33d1670f1
+Revises: da64232cbc6a
+Create Date: 2026-10-18 10:15:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '4da33d1670f1'
+down_revision = 'da64232cbc6a'
+branch_labels = None
+depends_on = None
+
+# Debe coincidir con CAMPOS_BUSQUEDA en main.py
+DOCUMENTO = " || ' ' || ".join(
+    f"COALESCE({campo}, '')"
+    for campo in ('nombre_cliente', 'producto', 'estado_pedido', 'detalles', 'contacto_detalle')
+)
+
+
+def upgrade():
+    dialecto = op.get_bind().dialect.name
+    if dialecto == 'postgresql':
+        op.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+        op.execute("""
+            CREATE TABLE pedido_busqueda (
+                pedido_id INTEGER PRIMARY KEY REFERENCES pedido (id) ON DELETE CASCADE,
+                documento TEXT NOT NULL,
+                vector TSVECTOR GENERATED ALWAYS AS (to_tsvector('spanish', documento)) STORED
+            )
+        """)
+        op.execute('CREATE INDEX ix_pedido_busqueda_vector ON pedido_busqueda USING GIN (vector)')
+        op.execute('CREATE INDEX ix_pedido_busqueda_trgm ON pedido_busqueda USING GIN (documento gin_trgm_ops)')
+        op.execute(f'INSERT INTO pedido_busqueda (pedido_id, documento) SELECT id, {DOCUMENTO} FROM pedido')
+    elif dialecto == 'sqlite':
+        op.execute("CREATE VIRTUAL TABLE pedido_busqueda USING fts5(documento, tokenize='unicode61 remove_diacritics 2')")
+        op.execute(f'INSERT INTO pedido_busqueda (rowid, documento) SELECT id, {DOCUMENTO} FROM pedido')
+
+
+def downgrade():
+    op.execute('DROP TABLE IF EXISTS pedido_busqueda')
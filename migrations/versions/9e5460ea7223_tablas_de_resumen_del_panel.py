@@ -0,0 +1,50 @@
+"""tablas de resumen del panel
+
+Revision ID: 9e5460ea7223
+Revises: 1c7560bf42bd
+Create Date: 2026-10-18 10:05:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '9e5460ea7223'
+down_revision = '1c7560bf42bd'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('resumen_totales',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('total_facturado', sa.Float(), nullable=False),
+    sa.Column('monto_pendiente', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_table('resumen_estado',
+    sa.Column('estado_pedido', sa.String(length=50), nullable=False),
+    sa.Column('cantidad', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('estado_pedido')
+    )
+    op.create_table('resumen_mensual',
+    sa.Column('mes', sa.String(length=7), nullable=False),
+    sa.Column('ingresos', sa.Float(), nullable=False),
+    sa.Column('cantidad', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('mes')
+    )
+    op.create_table('resumen_diario',
+    sa.Column('fecha', sa.String(length=10), nullable=False),
+    sa.Column('cantidad', sa.Integer(), nullable=False),
+    sa.PrimaryKeyConstraint('fecha')
+    )
+    # Después de aplicar esta migración hay que poblarlas con
+    # `flask reconstruir-resumen`.
+
+
+def downgrade():
+    op.drop_table('resumen_diario')
+    op.drop_table('resumen_mensual')
+    op.drop_table('resumen_estado')
+    op.drop_table('resumen_totales')
@@ -0,0 +1,36 @@
+"""serie diaria para informes
+
+Revision ID: a44aed6c184f
+Revises: df7ec1b3d326
+Create Date: 2026-10-18 10:40:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a44aed6c184f'
+down_revision = 'df7ec1b3d326'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('serie_diaria',
+    sa.Column('dia', sa.Date(), nullable=False),
+    sa.Column('producto', sa.String(length=100), nullable=False),
+    sa.Column('forma_contacto', sa.String(length=50), nullable=False),
+    sa.Column('estado_pago', sa.String(length=50), nullable=False),
+    sa.Column('cantidad', sa.Integer(), nullable=False),
+    sa.Column('importe', sa.Float(), nullable=False),
+    sa.Column('anticipos', sa.Float(), nullable=False),
+    sa.Column('pendiente', sa.Float(), nullable=False),
+    sa.PrimaryKeyConstraint('dia', 'producto', 'forma_contacto', 'estado_pago')
+    )
+    # Después de aplicar esta migración hay que poblarla con
+    # `flask reconstruir-series`.
+
+
+def downgrade():
+    op.drop_table('serie_diaria')
@@ -0,0 +1,26 @@
+"""estado de subida de imagen
+
+Revision ID: a656c069b607
+Revises: 4da33d1670f1
+Create Date: 2026-10-18 10:20:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'a656c069b607'
+down_revision = '4da33d1670f1'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('pedido', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('imagen_estado', sa.String(length=20), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('pedido', schema=None) as batch_op:
+        batch_op.drop_column('imagen_estado')
@@ -0,0 +1,26 @@
+"""indice (fecha_creacion, id) para paginación por cursor
+
+Revision ID: da64232cbc6a
+Revises: 9e5460ea7223
+Create Date: 2026-10-18 10:10:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'da64232cbc6a'
+down_revision = '9e5460ea7223'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('pedido', schema=None) as batch_op:
+        batch_op.create_index('ix_pedido_fecha_creacion_id', ['fecha_creacion', 'id'], unique=False)
+
+
+def downgrade():
+    with op.batch_alter_table('pedido', schema=None) as batch_op:
+        batch_op.drop_index('ix_pedido_fecha_creacion_id')
@@ -0,0 +1,26 @@
+"""derivadas de imagen
+
+Revision ID: df7ec1b3d326
+Revises: a656c069b607
+Create Date: 2026-10-18 10:25:00.000000
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = 'df7ec1b3d326'
+down_revision = 'a656c069b607'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    with op.batch_alter_table('pedido', schema=None) as batch_op:
+        batch_op.add_column(sa.Column('imagen_derivadas', sa.Text(), nullable=True))
+
+
+def downgrade():
+    with op.batch_alter_table('pedido', schema=None) as batch_op:
+        batch_op.drop_column('imagen_derivadas')
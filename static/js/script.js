@@ -84,6 +84,7 @@ document.addEventListener('DOMContentLoaded', function() {
             var anticipo = parseFloat(button.getAttribute('data-anticipo'));
             var estado_pedido = button.getAttribute('data-estado_pedido');
             var imagen_path = button.getAttribute('data-imagen_path');
+            var imagen_miniatura = button.getAttribute('data-imagen_miniatura');
 
             var modalForm = editPedidoModal.querySelector('#editPedidoForm');
             if(modalForm) modalForm.action = '/update_pedido/' + id;
@@ -110,7 +111,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 currentImagePreview.innerHTML = '';
                 if (imagen_path) {
                     var img = document.createElement('img');
-                    img.src = imagen_path;
+                    img.src = imagen_miniatura || imagen_path;
                     img.alt = 'Imagen Actual';
                     img.style.maxWidth = '100px';
                     img.style.maxHeight = '100px';
@@ -174,7 +175,7 @@ document.addEventListener('DOMContentLoaded', function() {
                 viewImagePreview.innerHTML = '';
                 if (data.imagen_path) {
                     const img = document.createElement('img');
-                    img.src = data.imagen_path;
+                    img.src = data.imagen_mediana || data.imagen_path;
                     img.alt = 'Imagen del Producto';
                     img.style.maxWidth = '100%';
                     img.style.height = 'auto';
@@ -195,8 +196,10 @@ document.addEventListener('DOMContentLoaded', function() {
 
     let estadoPedidosChartInstance = null;
     let ingresosMensualesChartInstance = null;
+    let datosGraficos = null;
 
     function renderCharts() {
+        if (!datosGraficos) return;
         const isDarkMode = body.classList.contains('dark-mode');
         const chartFontColor = isDarkMode ? 'rgba(255, 255, 255, 0.8)' : 'rgba(0, 0, 0, 0.8)';
         const chartGridColor = isDarkMode ? 'rgba(255, 255, 255, 0.1)' : 'rgba(0, 0, 0, 0.1)';
@@ -208,8 +211,7 @@ document.addEventListener('DOMContentLoaded', function() {
             if (estadoPedidosChartInstance) {
                 estadoPedidosChartInstance.destroy();
             }
-            const chartEstadosDataElement = document.getElementById('chart-estados-data');
-            const chartEstadosData = JSON.parse(chartEstadosDataElement.textContent);
+            const chartEstadosData = datosGraficos.chart_estados_data;
             estadoPedidosChartInstance = new Chart(estadoPedidosCtx, {
                 type: 'doughnut',
                 data: {
@@ -234,8 +236,7 @@ document.addEventListener('DOMContentLoaded', function() {
             if (ingresosMensualesChartInstance) {
                 ingresosMensualesChartInstance.destroy();
             }
-            const chartIngresosDataElement = document.getElementById('chart-ingresos-data');
-            const chartIngresosData = JSON.parse(chartIngresosDataElement.textContent);
+            const chartIngresosData = datosGraficos.chart_ingresos_data;
             ingresosMensualesChartInstance = new Chart(ingresosMensualesCtx, {
                 type: 'bar',
                 data: {
@@ -284,6 +285,18 @@ document.addEventListener('DOMContentLoaded', function() {
         setDarkMode(false);
     }
 
+    // Los datos de los gráficos se piden después del primer pintado
+    const chartsContainer = document.getElementById('charts-container');
+    if (chartsContainer && chartsContainer.dataset.url) {
+        fetch(chartsContainer.dataset.url)
+            .then(response => response.json())
+            .then(datos => {
+                datosGraficos = datos;
+                renderCharts();
+            })
+            .catch(err => console.log('Error cargando gráficos: ', err));
+    }
+
     if (darkModeToggle) {
         darkModeToggle.addEventListener('click', () => {
             const isDarkModeEnabled = body.classList.contains('dark-mode');
@@ -293,18 +306,20 @@ document.addEventListener('DOMContentLoaded', function() {
 
     const table = document.getElementById('pedidosTable');
     const tableBody = table.querySelector('tbody');
-    const rows = Array.from(tableBody.querySelectorAll('tr'));
+    // Las filas cambian al guardar vía fetch, así que se leen cada vez
+    const filasTabla = () => Array.from(tableBody.querySelectorAll('tr'));
     const headers = table.querySelectorAll('th[data-sort]');
     let currentSort = { column: null, direction: 'asc' };
     const calendarioEl = document.getElementById('calendario');
     const showAllBtn = document.getElementById('showAllBtn');
     let calendar = null;
+    let calendarioSinCache = false;
 
     headers.forEach(header => {
         header.addEventListener('click', () => {
             const column = header.getAttribute('data-sort');
             const direction = (currentSort.column === column && currentSort.direction === 'asc') ? 'desc' : 'asc';
-            const sortedRows = rows.sort((a, b) => {
+            const sortedRows = filasTabla().sort((a, b) => {
                 let valA = a.querySelector(`td:nth-child(${header.cellIndex + 1})`).textContent.trim();
                 let valB = b.querySelector(`td:nth-child(${header.cellIndex + 1})`).textContent.trim();
                 if (column === 'precio') {
@@ -324,18 +339,29 @@ document.addEventListener('DOMContentLoaded', function() {
     });
 
     if (calendarioEl) {
-        const fechasPedidosJson = calendarioEl.getAttribute('data-dates');
-        const fechasPedidos = JSON.parse(fechasPedidosJson);
-        const eventos = fechasPedidos.map(fecha => ({ start: fecha, display: 'background', classNames: ['event-day'] }));
         calendar = new FullCalendar.Calendar(calendarioEl, {
             initialView: 'dayGridMonth',
             locale: 'es',
             headerToolbar: { left: 'prev,next today', center: 'title', right: 'dayGridMonth,timeGridWeek' },
-            events: eventos,
+            // Feed por rango con start/end de la vista visible. Tras guardar un
+            // pedido se pide sin caché (ni la del navegador ni la del service worker).
+            events: function(info, exito, fallo) {
+                const parametros = new URLSearchParams({ start: info.startStr, end: info.endStr });
+                const opciones = calendarioSinCache ? { cache: 'no-cache' } : {};
+                calendarioSinCache = false;
+                fetch(`${calendarioEl.dataset.url}?${parametros}`, opciones)
+                    .then(response => response.json())
+                    .then(exito)
+                    .catch(fallo);
+            },
+            eventDidMount: function(info) {
+                const cantidad = info.event.extendedProps.cantidad;
+                if (cantidad) info.el.title = `${cantidad} pedido${cantidad === 1 ? '' : 's'}`;
+            },
             dateClick: function(info) {
                 const clickedDate = info.dateStr;
                 let hasEvent = false;
-                rows.forEach(row => {
+                filasTabla().forEach(row => {
                     const rowDate = row.cells[5].textContent.split(' ')[0];
                     if (rowDate === clickedDate) {
                         row.style.display = '';
@@ -352,13 +378,43 @@ document.addEventListener('DOMContentLoaded', function() {
 
     if (showAllBtn) {
         showAllBtn.addEventListener('click', () => {
-            rows.forEach(row => { row.style.display = ''; });
+            filasTabla().forEach(row => { row.style.display = ''; });
             showAllBtn.style.display = 'none';
             const searchInput = document.getElementById('searchInput');
             if (searchInput) searchInput.value = '';
         });
     }
 
+    // --- Sugerencias de búsqueda (typeahead) ---
+    const searchInput = document.getElementById('searchInput');
+    const sugerenciasBusqueda = document.getElementById('sugerenciasBusqueda');
+    if (searchInput && sugerenciasBusqueda) {
+        let temporizadorBusqueda = null;
+        searchInput.addEventListener('input', () => {
+            clearTimeout(temporizadorBusqueda);
+            const texto = searchInput.value.trim();
+            if (texto.length < 2) return;
+            temporizadorBusqueda = setTimeout(() => {
+                fetch(`${searchInput.dataset.url}?q=${encodeURIComponent(texto)}`)
+                    .then(response => response.ok ? response.json() : [])
+                    .then(resultados => {
+                        sugerenciasBusqueda.innerHTML = '';
+                        const vistos = new Set();
+                        resultados.forEach(pedido => {
+                            [pedido.nombre_cliente, pedido.producto].forEach(valor => {
+                                if (!valor || vistos.has(valor)) return;
+                                vistos.add(valor);
+                                const option = document.createElement('option');
+                                option.value = valor;
+                                sugerenciasBusqueda.appendChild(option);
+                            });
+                        });
+                    })
+                    .catch(() => {});
+            }, 200);
+        });
+    }
+
     var toastElList = [].slice.call(document.querySelectorAll('.toast'));
     var toastList = toastElList.map(function (toastEl) {
         return new bootstrap.Toast(toastEl, { delay: 3000 });
@@ -403,4 +459,150 @@ document.addEventListener('DOMContentLoaded', function() {
             }
         });
     }
-});
\ No newline at end of file
+
+    // --- Guardado sin recargar la página ---
+    // Los formularios se envían con fetch pidiendo JSON; el servidor devuelve
+    // la fila cambiada y los deltas del resumen. Si la petición falla por red,
+    // se recurre al envío normal del formulario.
+    function mostrarAviso(mensaje, categoria) {
+        let contenedor = document.querySelector('.toast-container');
+        if (!contenedor) {
+            contenedor = document.createElement('div');
+            contenedor.className = 'toast-container position-fixed top-0 end-0 p-3';
+            contenedor.style.zIndex = 11;
+            document.body.appendChild(contenedor);
+        }
+        const toastEl = document.createElement('div');
+        toastEl.className = `toast align-items-center text-white bg-${categoria} border-0`;
+        toastEl.setAttribute('role', 'alert');
+        toastEl.innerHTML = '<div class="d-flex"><div class="toast-body"></div>' +
+            '<button type="button" class="btn-close btn-close-white me-2 m-auto" data-bs-dismiss="toast" aria-label="Close"></button></div>';
+        toastEl.querySelector('.toast-body').textContent = mensaje;
+        toastEl.addEventListener('hidden.bs.toast', () => toastEl.remove());
+        contenedor.appendChild(toastEl);
+        new bootstrap.Toast(toastEl, { delay: 3000 }).show();
+    }
+
+    function sumarA(elemento, delta, decimales) {
+        if (!elemento || !delta) return;
+        const valor = (parseFloat(elemento.dataset.valor ?? elemento.textContent) || 0) + delta;
+        elemento.dataset.valor = valor;
+        elemento.textContent = decimales ? valor.toFixed(decimales) : valor;
+    }
+
+    function aplicarDeltas(deltas) {
+        sumarA(document.getElementById('totalFacturado'), deltas.totales.total_facturado, 2);
+        sumarA(document.getElementById('montoPendiente'), deltas.totales.monto_pendiente, 2);
+        sumarA(document.getElementById('totalPedidos'),
+               Object.values(deltas.estados).reduce((total, n) => total + n, 0), 0);
+
+        if (datosGraficos) {
+            // Mismo criterio que leer_graficos(): sin entradas vacías y meses ordenados
+            const estados = datosGraficos.chart_estados_data;
+            Object.entries(deltas.estados).forEach(([estado, cantidad]) => {
+                const i = estados.labels.indexOf(estado);
+                if (i === -1) {
+                    estados.labels.push(estado);
+                    estados.data.push(cantidad);
+                } else {
+                    estados.data[i] += cantidad;
+                }
+            });
+            const ingresos = datosGraficos.chart_ingresos_data;
+            Object.entries(deltas.meses).forEach(([mes, valores]) => {
+                const i = ingresos.labels.indexOf(mes);
+                if (i === -1) {
+                    ingresos.labels.push(mes);
+                    ingresos.data.push(valores.ingresos || 0);
+                } else {
+                    ingresos.data[i] += valores.ingresos || 0;
+                    if (valores.cantidad < 0 && Math.abs(ingresos.data[i]) < 0.005) {
+                        ingresos.labels.splice(i, 1);
+                        ingresos.data.splice(i, 1);
+                    }
+                }
+            });
+            [estados, ingresos].forEach(serie => {
+                const pares = serie.labels.map((label, i) => [label, serie.data[i]])
+                    .filter(([, valor]) => serie === ingresos || valor > 0)
+                    .sort(([a], [b]) => a < b ? -1 : a > b ? 1 : 0);
+                serie.labels = pares.map(([label]) => label);
+                serie.data = pares.map(([, valor]) => valor);
+            });
+            renderCharts();
+        }
+        if (calendar && Object.keys(deltas.dias).length) {
+            calendarioSinCache = true;
+            calendar.refetchEvents();
+        }
+    }
+
+    function colocarFila(respuesta) {
+        const actual = document.getElementById(`pedido-${respuesta.id}`);
+        if (respuesta.eliminado) {
+            if (actual) actual.remove();
+            return;
+        }
+        const plantilla = document.createElement('template');
+        plantilla.innerHTML = respuesta.fila_html.trim();
+        const fila = plantilla.content.firstElementChild;
+        fila.style.opacity = 1;
+        if (actual) {
+            actual.replaceWith(fila);
+        } else if (table.dataset.primeraPagina === 'true') {
+            // Los pedidos nuevos solo se ven en la primera página del listado
+            tableBody.prepend(fila);
+            const porPagina = parseInt(table.dataset.porPagina, 10);
+            const filas = filasTabla();
+            if (porPagina && filas.length > porPagina) filas.slice(porPagina).forEach(f => f.remove());
+        }
+    }
+
+    function enviarConFetch(formId, modalId) {
+        const form = document.getElementById(formId);
+        if (!form) return;
+        form.addEventListener('submit', event => {
+            event.preventDefault();
+            const botones = form.querySelectorAll('button[type="submit"]');
+            botones.forEach(b => b.disabled = true);
+            fetch(form.action, {
+                method: 'POST',
+                body: new FormData(form),
+                headers: { 'Accept': 'application/json' },
+                credentials: 'same-origin'
+            })
+                .then(response => {
+                    // Sesión caducada u otra respuesta HTML: se sigue como haría el navegador
+                    if (!(response.headers.get('Content-Type') || '').includes('application/json')) {
+                        if (response.redirected) window.location.href = response.url;
+                        else mostrarAviso('No se pudo guardar el pedido.', 'danger');
+                        return null;
+                    }
+                    return response.json().then(datos => ({ ok: response.ok, datos }));
+                }, () => {
+                    // Sin conexión con el servidor: envío normal del formulario
+                    form.submit();
+                    return null;
+                })
+                .then(resultado => {
+                    if (!resultado) return;
+                    const { ok, datos } = resultado;
+                    if (!ok) {
+                        (datos.errores || ['No se pudo guardar el pedido.']).forEach(e => mostrarAviso(e, 'danger'));
+                        return;
+                    }
+                    colocarFila(datos);
+                    aplicarDeltas(datos.deltas);
+                    const modalEl = document.getElementById(modalId);
+                    if (modalEl) bootstrap.Modal.getOrCreateInstance(modalEl).hide();
+                    datos.avisos.forEach(aviso => mostrarAviso(aviso.mensaje, aviso.categoria));
+                })
+                .catch(err => console.log('Error aplicando el cambio: ', err))
+                .finally(() => botones.forEach(b => b.disabled = false));
+        });
+    }
+
+    enviarConFetch('addPedidoForm', 'addPedidoModal');
+    enviarConFetch('editPedidoForm', 'editPedidoModal');
+    enviarConFetch('deleteForm', 'confirmDeleteModal');
+});
@@ -1,4 +0,0 @@
-self.addEventListener('fetch', function(event) {
-  // Este service worker es intencionalmente simple y no implementa caché.
-  // Su propósito principal es permitir la instalación de la PWA.
-});
\ No newline at end of file
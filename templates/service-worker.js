@@ -0,0 +1,99 @@
+// Service worker de la PWA. Se sirve renderizado desde /service-worker.js
+// (ver service_worker() en main.py), así que la versión y la lista del app
+// shell cambian solas con cada despliegue y el navegador instala el nuevo.
+const VERSION = '{{ version }}';
+const CACHE_APP_SHELL = `robleka-shell-${VERSION}`;
+const CACHE_DATOS = 'robleka-datos';
+const APP_SHELL = {{ recursos | tojson }};
+// Datos que se sirven desde caché mientras se revalidan en segundo plano
+const RUTAS_DATOS = ['/api/graficos', '/api/calendario', '/api/informes', '/api/buscar'];
+
+self.addEventListener('install', event => {
+  event.waitUntil(
+    // Uno a uno: con mala conexión, un recurso que falle no debe impedir la
+    // instalación (se guardará la primera vez que se pida)
+    caches.open(CACHE_APP_SHELL)
+      .then(cache => Promise.all(APP_SHELL.map(url => cache.add(url).catch(() => {}))))
+      .then(() => self.skipWaiting())
+  );
+});
+
+self.addEventListener('activate', event => {
+  event.waitUntil(
+    caches.keys()
+      .then(nombres => Promise.all(nombres
+        .filter(nombre => nombre.startsWith('robleka-shell-') && nombre !== CACHE_APP_SHELL)
+        .map(nombre => caches.delete(nombre))))
+      .then(() => self.clients.claim())
+  );
+});
+
+function guardable(response) {
+  // Ni redirecciones (p. ej. al login) ni errores
+  return response && response.ok && !response.redirected;
+}
+
+// Primero la caché: los estáticos llevan su huella en la URL y no cambian
+function primeroCache(request) {
+  return caches.match(request).then(enCache => enCache || fetch(request).then(response => {
+    if (guardable(response)) {
+      const copia = response.clone();
+      caches.open(CACHE_APP_SHELL).then(cache => cache.put(request, copia));
+    }
+    return response;
+  }));
+}
+
+// Stale-while-revalidate: respuesta inmediata desde caché y actualización
+// en segundo plano (barata gracias al ETag: casi siempre es un 304)
+function revalidarEnSegundoPlano(event) {
+  const request = event.request;
+  const red = fetch(request).then(response => {
+    if (guardable(response)) {
+      const copia = response.clone();
+      return caches.open(CACHE_DATOS).then(cache => cache.put(request, copia)).then(() => response);
+    }
+    return response;
+  });
+  event.waitUntil(red.catch(() => {}));
+  return caches.open(CACHE_DATOS)
+    .then(cache => cache.match(request))
+    .then(enCache => enCache || red);
+}
+
+// Primero la red (páginas y datos pedidos sin caché), con la última copia
+// si no hay conexión
+function primeroRed(request) {
+  return fetch(request).then(response => {
+    if (guardable(response)) {
+      const copia = response.clone();
+      caches.open(CACHE_DATOS).then(cache => cache.put(request, copia));
+    }
+    return response;
+  }).catch(() => caches.open(CACHE_DATOS)
+    .then(cache => cache.match(request)
+      .then(enCache => enCache || (request.mode === 'navigate' ? cache.match('/') : undefined)))
+    .then(enCache => enCache || Response.error()));
+}
+
+self.addEventListener('fetch', event => {
+  const request = event.request;
+  const url = new URL(request.url);
+
+  if (request.method !== 'GET') {
+    // Una escritura deja obsoletos los datos guardados
+    if (url.origin === self.location.origin) {
+      event.waitUntil(caches.delete(CACHE_DATOS));
+    }
+    return;
+  }
+
+  if (APP_SHELL.includes(url.origin === self.location.origin ? url.pathname + url.search : request.url)) {
+    event.respondWith(primeroCache(request));
+  } else if (url.origin === self.location.origin && RUTAS_DATOS.includes(url.pathname)) {
+    // fetch(..., { cache: 'no-cache' }) pide explícitamente datos frescos
+    event.respondWith(request.cache === 'no-cache' ? primeroRed(request) : revalidarEnSegundoPlano(event));
+  } else if (request.mode === 'navigate' && url.origin === self.location.origin) {
+    event.respondWith(primeroRed(request));
+  }
+});
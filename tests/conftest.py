@@ -0,0 +1,81 @@
+import io
+import os
+import sys
+import tempfile
+
+import pytest
+
+# main.py lee la configuración del entorno al importarse: base SQLite
+# temporal, almacén local y tareas de imagen en la propia petición.
+_directorio = tempfile.mkdtemp(prefix='robleka-tests-')
+os.environ['DATABASE_URL'] = 'sqlite:///' + os.path.join(_directorio, 'pedidos.db')
+os.environ.pop('DATABASE_URL_LECTURA', None)
+os.environ['ALMACEN_IMAGENES'] = 'local'
+os.environ['SUBIDAS_SINCRONAS'] = '1'
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, RAIZ)
+
+import main  # noqa: E402
+
+
+@pytest.fixture(scope='session')
+def app():
+    from flask_migrate import upgrade
+
+    main.app.config['TESTING'] = True
+    with main.app.app_context():
+        upgrade(directory=os.path.join(RAIZ, 'migrations'))
+    return main.app
+
+
+@pytest.fixture
+def db(app):
+    with app.app_context():
+        for tabla in reversed(main.db.metadata.sorted_tables):
+            main.db.session.execute(tabla.delete())
+        main.db.session.execute(main.db.text('DELETE FROM pedido_busqueda'))
+        main.db.session.commit()
+        yield main.db
+        main.db.session.remove()
+
+
+@pytest.fixture
+def cliente(app, db):
+    cliente = app.test_client()
+    with cliente.session_transaction() as sesion:
+        sesion['_user_id'] = 'robleka'
+        sesion['_fresh'] = True
+    return cliente
+
+
+@pytest.fixture
+def estaticos(app, tmp_path, monkeypatch):
+    # Las subidas y derivadas van a un directorio temporal, no a static/
+    monkeypatch.setattr(app, 'static_folder', str(tmp_path))
+    monkeypatch.setattr(app, 'static_url_path', '/static')
+    return tmp_path
+
+
+def datos_formulario(**cambios):
+    datos = {
+        'nombre_cliente': 'Ana García',
+        'forma_contacto': 'WhatsApp',
+        'contacto_detalle': '600000000',
+        'direccion_entrega': 'Calle Mayor 1',
+        'producto': 'Bandeja',
+        'detalles': 'grabado roble',
+        'precio': '30',
+        'anticipo': '10',
+        'estado_pedido': 'Pendiente',
+    }
+    datos.update(cambios)
+    return datos
+
+
+def imagen_png():
+    Image = pytest.importorskip('PIL.Image')
+    datos = io.BytesIO()
+    Image.new('RGB', (1200, 900), (180, 120, 60)).save(datos, 'PNG')
+    datos.seek(0)
+    return datos
@@ -0,0 +1,61 @@
+import pytest
+
+import main
+from conftest import datos_formulario
+
+
+@pytest.mark.parametrize('url', ['/api/graficos', '/api/calendario?start=2020-01-01&end=2100-01-01',
+                                 '/api/informes?granularidad=mes'])
+def test_api_revalida_tras_una_escritura(cliente, url):
+    response = cliente.get(url)
+    assert response.cache_control.no_cache
+    assert response.cache_control.max_age is None
+    etag = response.headers['ETag']
+
+    assert cliente.get(url, headers={'If-None-Match': etag}).status_code == 304
+
+    # Como el navegador: la redirección a index() muestra (y consume) el aviso
+    cliente.post('/add_pedido', data=datos_formulario(), follow_redirects=True)
+    response = cliente.get(url, headers={'If-None-Match': etag})
+    assert response.status_code == 200
+    assert response.headers['ETag'] != etag
+    assert response.json
+
+
+def test_huella_aplicacion_ignora_las_subidas(estaticos):
+    (estaticos / 'js').mkdir()
+    (estaticos / 'js' / 'script.js').write_text('// v1')
+    (estaticos / 'uploads' / 'derivadas').mkdir(parents=True)
+    huella = main.huella_aplicacion()
+
+    (estaticos / 'uploads' / 'foto.png').write_bytes(b'png')
+    (estaticos / 'uploads' / 'derivadas' / 'abc.webp').write_bytes(b'webp')
+    assert main.huella_aplicacion() == huella
+
+    (estaticos / 'js' / 'app.js').write_text('// nuevo')
+    assert main.huella_aplicacion() != huella
+
+
+@pytest.mark.parametrize('limite, esperados', [('-1', 1), ('0', 1), ('2', 2), ('1000', 3)])
+def test_api_buscar_acota_el_limite(cliente, limite, esperados):
+    for numero in range(3):
+        cliente.post('/add_pedido', data=datos_formulario(nombre_cliente=f'Ana {numero}'), follow_redirects=True)
+    assert len(cliente.get(f'/api/buscar?q=ana&limite={limite}').json) == esperados
+
+
+def test_metrics_sin_token_no_es_publica(app):
+    assert app.test_client().get('/metrics').status_code == 302
+
+
+def test_metrics_sin_token_con_sesion(cliente):
+    response = cliente.get('/metrics')
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+
+
+def test_metrics_con_token_exige_bearer(app, monkeypatch):
+    monkeypatch.setitem(app.config, 'METRICS_TOKEN', 'secreto')
+    cliente = app.test_client()
+    assert cliente.get('/metrics').status_code == 401
+    assert cliente.get('/metrics', headers={'Authorization': 'Bearer otro'}).status_code == 401
+    assert cliente.get('/metrics', headers={'Authorization': 'Bearer secreto'}).status_code == 200
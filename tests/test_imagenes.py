@@ -0,0 +1,125 @@
+import json
+import os
+
+import pytest
+
+import main
+from conftest import datos_formulario, imagen_png
+
+
+def ruta_en(estaticos, imagen_path):
+    return os.path.join(estaticos, imagen_path[len('/static/'):])
+
+
+def test_subida_guarda_imagen_y_derivadas(cliente, estaticos):
+    datos = datos_formulario(imagen=(imagen_png(), 'foto.png'))
+    response = cliente.post('/add_pedido', data=datos, content_type='multipart/form-data')
+    assert response.status_code == 302
+
+    pedido = main.Pedido.query.one()
+    assert pedido.imagen_estado == 'subida'
+    assert pedido.imagen_path.startswith('/static/uploads/almacen/')
+    assert '?' not in pedido.imagen_path
+    assert os.path.exists(ruta_en(estaticos, pedido.imagen_path))
+
+    derivadas = json.loads(pedido.imagen_derivadas)
+    assert set(derivadas) == set(main.VARIANTES_IMAGEN)
+    for archivo in derivadas.values():
+        assert os.path.exists(os.path.join(estaticos, 'uploads', 'derivadas', archivo))
+
+    # El archivo temporal de static/uploads se elimina tras subirlo
+    assert [nombre for nombre in os.listdir(estaticos / 'uploads') if nombre.endswith('.png')] == []
+
+
+class AlmacenFalso:
+    # Almacén de pruebas: registra las llamadas y puede fallar a propósito
+    def __init__(self):
+        self.subidas = []
+        self.borrados = []
+        self.fallar = False
+
+    def subir(self, ruta):
+        if self.fallar:
+            raise OSError('sin conexión')
+        self.subidas.append(ruta)
+        return f'https://almacen.test/{os.path.basename(ruta)}'
+
+    def borrar(self, urls):
+        self.borrados.append(list(urls))
+
+
+@pytest.fixture
+def almacen_falso(app, monkeypatch):
+    almacen = AlmacenFalso()
+    monkeypatch.setitem(main.ALMACENES_IMAGENES, 'falso', lambda: almacen)
+    monkeypatch.setitem(app.config, 'ALMACEN_IMAGENES', 'falso')
+    monkeypatch.setattr(main.time, 'sleep', lambda segundos: None)
+    return almacen
+
+
+def test_subida_en_segundo_plano_pasa_de_pendiente_a_subida(app, cliente, estaticos, almacen_falso, monkeypatch):
+    tareas = []
+    monkeypatch.setitem(app.config, 'SUBIDAS_SINCRONAS', False)
+    monkeypatch.setattr(main.ejecutor_imagenes, 'submit', lambda funcion, *args: tareas.append((funcion, args)))
+
+    datos = datos_formulario(imagen=(imagen_png(), 'foto.png'))
+    cliente.post('/add_pedido', data=datos, content_type='multipart/form-data')
+    pedido = main.Pedido.query.one()
+    assert pedido.imagen_estado == 'pendiente'
+    temporal = ruta_en(estaticos, pedido.imagen_path)
+    assert os.path.exists(temporal)
+
+    for funcion, args in tareas:
+        funcion(*args)
+    main.db.session.expire_all()
+    pedido = main.Pedido.query.one()
+    assert pedido.imagen_estado == 'subida'
+    assert pedido.imagen_path == f'https://almacen.test/{os.path.basename(temporal)}'
+    assert almacen_falso.subidas == [temporal]
+    assert not os.path.exists(temporal)
+    assert set(json.loads(pedido.imagen_derivadas)) == set(main.VARIANTES_IMAGEN)
+
+
+def test_subida_fallida_queda_en_error_y_conserva_el_archivo(cliente, estaticos, almacen_falso, caplog):
+    almacen_falso.fallar = True
+    datos = datos_formulario(imagen=(imagen_png(), 'foto.png'))
+    cliente.post('/add_pedido', data=datos, content_type='multipart/form-data')
+
+    # El traceback registrado mantiene vivo el pedido de la petición en la sesión
+    main.db.session.expire_all()
+    pedido = main.Pedido.query.one()
+    assert pedido.imagen_estado == 'error'
+    errores = [registro for registro in caplog.records if registro.levelname == 'ERROR']
+    assert len(errores) == main.SUBIDA_REINTENTOS
+    assert all(registro.exc_info for registro in errores)
+    # Se conserva para `flask reintentar-subidas`
+    assert os.path.exists(ruta_en(estaticos, pedido.imagen_path))
+
+
+def test_borrar_pedido_borra_su_imagen(cliente, estaticos, almacen_falso):
+    datos = datos_formulario(imagen=(imagen_png(), 'foto.png'))
+    cliente.post('/add_pedido', data=datos, content_type='multipart/form-data')
+    pedido = main.Pedido.query.one()
+
+    cliente.post(f'/delete_pedido/{pedido.id}')
+    assert almacen_falso.borrados == [[pedido.imagen_path]]
+
+
+def test_borrados_se_envian_en_lotes(app, almacen_falso, monkeypatch):
+    monkeypatch.setattr(main, 'BORRADO_LOTE', 2)
+    urls = [f'https://almacen.test/{numero}.png' for numero in range(5)]
+    with app.app_context():
+        main.programar_borrado_imagenes(urls)
+    assert almacen_falso.borrados == [urls[0:2], urls[2:4], urls[4:5]]
+
+
+def test_borrar_pedido_importado_no_borra_la_imagen_externa(cliente, almacen_falso):
+    url = 'https://res.cloudinary.com/robleka/image/upload/compartida.png'
+    fila = dict(datos_formulario(), imagen_path=url)
+    assert cliente.post('/import_pedidos', json=[fila]).json['insertados'] == 1
+    pedido = main.Pedido.query.one()
+    assert (pedido.imagen_path, pedido.imagen_estado) == (url, 'externa')
+
+    cliente.post(f'/delete_pedido/{pedido.id}')
+    assert main.Pedido.query.count() == 0
+    assert almacen_falso.borrados == []
@@ -0,0 +1,62 @@
+import io
+
+import pytest
+
+import main
+from conftest import datos_formulario
+
+
+def fila(**cambios):
+    datos = datos_formulario(**cambios)
+    del datos['estado_pedido']
+    return datos
+
+
+def test_importacion_rechaza_filas_no_validas_sin_perder_el_resto(cliente):
+    filas = [
+        fila(),
+        fila(precio='nan'),
+        fila(precio='inf'),
+        fila(anticipo='-inf'),
+        fila(nombre_cliente='x' * 101),
+        fila(direccion_entrega='x' * 201),
+        fila(precio='20', anticipo='20'),
+    ]
+    response = cliente.post('/import_pedidos', json=filas)
+    assert response.status_code == 200
+    assert response.json['insertados'] == 2
+    assert [error['fila'] for error in response.json['errores']] == [2, 3, 4, 5, 6]
+
+    totales = main.leer_totales()
+    assert totales['total_pedidos'] == 2
+    assert totales['total_facturado'] == 30.0
+    assert totales['monto_pendiente'] == 20.0
+
+
+def test_alta_rechaza_precio_no_finito(cliente):
+    response = cliente.post('/add_pedido', data=datos_formulario(precio='nan'),
+                            headers={'Accept': 'application/json'})
+    assert response.status_code == 400
+    assert main.Pedido.query.count() == 0
+
+
+@pytest.mark.parametrize('cuerpo', [5, 'texto', {'nombre_cliente': 'Ana'}])
+def test_importacion_json_exige_una_lista(cliente, cuerpo):
+    response = cliente.post('/import_pedidos', json=cuerpo)
+    assert response.status_code == 400
+    assert main.Pedido.query.count() == 0
+
+
+def test_importacion_de_archivo_json_exige_una_lista(cliente):
+    archivo = (io.BytesIO(b'{"nombre_cliente": "Ana"}'), 'pedidos.json')
+    response = cliente.post('/import_pedidos', data={'archivo': archivo}, content_type='multipart/form-data')
+    assert response.status_code == 400
+
+
+@pytest.mark.parametrize('cuerpo', [[1, 2], {'ids': '12', 'estado_pedido': 'Completado'},
+                                    {'ids': 12, 'estado_pedido': 'Completado'}])
+def test_cambio_masivo_valida_el_cuerpo(cliente, cuerpo):
+    cliente.post('/add_pedido', data=datos_formulario(), follow_redirects=True)
+    response = cliente.post('/bulk_estado', json=cuerpo)
+    assert response.status_code == 400
+    assert main.Pedido.query.one().estado_pedido == 'Pendiente'
@@ -0,0 +1,79 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+from sqlalchemy import create_engine
+
+import main
+from conftest import datos_formulario
+
+
+@pytest.fixture
+def replica(app, cliente, tmp_path):
+    # Réplica = copia de solo lectura de la base principal en ese momento
+    cliente.post('/add_pedido', data=datos_formulario(nombre_cliente='Ana Réplica'), follow_redirects=True)
+    ruta = tmp_path / 'replica.db'
+    shutil.copyfile(main.db.engine.url.database, ruta)
+    url = f'sqlite:///file:{ruta}?mode=ro&uri=true'
+    motor = create_engine(url, **main.opciones_motor(url))
+    main.db.engines['lectura'] = motor
+    yield motor
+    del main.db.engines['lectura']
+    motor.dispose()
+
+
+def test_lecturas_del_panel_van_a_la_replica(cliente, replica):
+    # Escribir con réplica configurada funciona: las escrituras van a la principal
+    response = cliente.post('/add_pedido', data=datos_formulario(nombre_cliente='Luis Principal'),
+                            follow_redirects=True)
+    assert response.status_code == 200
+    assert main.Pedido.query.count() == 2
+
+    # El listado normal sale de la principal...
+    assert 'Luis Principal' in cliente.get('/').get_data(as_text=True)
+    # ...y agregados, búsqueda, informes y exportación, de la réplica
+    assert cliente.get('/api/graficos').json['chart_estados_data']['data'] == [1]
+    assert sum(dia['extendedProps']['cantidad'] for dia in cliente.get('/api/calendario').json) == 1
+    assert [fila['cantidad'] for fila in cliente.get('/api/informes?granularidad=mes').json['filas']] == [1]
+    assert [pedido['nombre_cliente'] for pedido in cliente.get('/api/buscar?q=ana').json] == ['Ana Réplica']
+    assert cliente.get('/api/buscar?q=luis').json == []
+    exportacion = cliente.get('/export/csv').get_data(as_text=True)
+    assert 'Ana Réplica' in exportacion and 'Luis Principal' not in exportacion
+    with main.app.app_context():
+        assert main.leer_totales()['total_pedidos'] == 1
+
+
+def test_database_url_lectura_crea_el_bind(tmp_path):
+    # main.py lee el entorno al importarse, así que se comprueba en otro proceso
+    entorno = dict(os.environ, DATABASE_URL_LECTURA=f'sqlite:///{tmp_path / "replica.db"}')
+    codigo = ('import main\n'
+              'with main.app.app_context():\n'
+              '    print(main.db.engines["lectura"].url.database, main.sesion_lectura() is not main.db.session)')
+    salida = subprocess.run([sys.executable, '-c', codigo], env=entorno, cwd=os.path.dirname(main.__file__),
+                            capture_output=True, text=True, check=True).stdout.split()
+    assert salida == [str(tmp_path / 'replica.db'), 'True']
+
+
+def test_sin_replica_se_lee_de_la_principal(app, db):
+    assert 'lectura' not in db.engines
+    assert main.sesion_lectura() is db.session
+
+
+def test_opciones_motor(monkeypatch):
+    monkeypatch.setenv('DB_POOL_SIZE', '3')
+    monkeypatch.setenv('DB_MAX_OVERFLOW', '2')
+    monkeypatch.setenv('DB_POOL_RECYCLE', '600')
+    monkeypatch.setenv('DB_POOL_PRE_PING', '0')
+    monkeypatch.setenv('DB_TIMEOUT_SENTENCIA_MS', '5000')
+
+    assert main.opciones_motor('postgresql://localhost/pedidos') == {
+        'pool_pre_ping': False, 'pool_recycle': 600, 'pool_size': 3, 'max_overflow': 2,
+        'connect_args': {'options': '-c statement_timeout=5000'},
+    }
+    # SQLite no tiene statement_timeout
+    assert 'connect_args' not in main.opciones_motor('sqlite:///pedidos.db')
+    for variable in ('DB_POOL_SIZE', 'DB_MAX_OVERFLOW', 'DB_POOL_RECYCLE', 'DB_POOL_PRE_PING'):
+        monkeypatch.delenv(variable)
+    assert main.opciones_motor(os.environ['DATABASE_URL']) == {'pool_pre_ping': True, 'pool_recycle': 1800}
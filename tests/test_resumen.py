@@ -0,0 +1,84 @@
+import random
+from datetime import datetime, timedelta
+
+import main
+from conftest import datos_formulario
+
+PRODUCTOS = ['Bandeja', 'Caja', 'Mesa']
+FORMAS_CONTACTO = ['WhatsApp', 'Instagram', 'Email']
+
+
+def foto_resumen():
+    # Estado de las tablas derivadas, sin las filas que se quedaron a cero
+    main.db.session.expire_all()
+    redondear = lambda valor: round(valor, 6)
+    totales = main.db.session.get(main.ResumenTotales, 1)
+    return {
+        'totales': (redondear(totales.total_facturado), redondear(totales.monto_pendiente)) if totales else None,
+        'estados': {fila.estado_pedido: fila.cantidad
+                    for fila in main.ResumenEstado.query.filter(main.ResumenEstado.cantidad > 0)},
+        'meses': {fila.mes: (redondear(fila.ingresos), fila.cantidad)
+                  for fila in main.ResumenMensual.query.filter(main.ResumenMensual.cantidad > 0)},
+        'dias': {fila.fecha: fila.cantidad
+                 for fila in main.ResumenDiario.query.filter(main.ResumenDiario.cantidad > 0)},
+        'serie': {(fila.dia, fila.producto, fila.forma_contacto, fila.estado_pago):
+                  (fila.cantidad, redondear(fila.importe), redondear(fila.anticipos), redondear(fila.pendiente))
+                  for fila in main.SerieDiaria.query.filter(main.SerieDiaria.cantidad > 0)},
+    }
+
+
+def datos_aleatorios(rng):
+    precio = rng.choice([12.5, 30, 45, 180])
+    return datos_formulario(
+        producto=rng.choice(PRODUCTOS),
+        forma_contacto=rng.choice(FORMAS_CONTACTO),
+        precio=str(precio),
+        anticipo=str(rng.choice([0, precio / 2, precio])),
+        estado_pedido=rng.choice(main.ESTADOS_PEDIDO),
+    )
+
+
+def test_deltas_coinciden_con_la_reconstruccion(cliente):
+    rng = random.Random(20240601)
+    for _ in range(150):
+        ids = [pedido_id for (pedido_id,) in main.db.session.query(main.Pedido.id)]
+        operacion = rng.choice(['alta', 'alta', 'edicion', 'masiva', 'importacion', 'baja'] if ids else ['alta'])
+        if operacion == 'alta':
+            response = cliente.post('/add_pedido', data=datos_aleatorios(rng))
+        elif operacion == 'edicion':
+            response = cliente.post(f'/update_pedido/{rng.choice(ids)}', data=datos_aleatorios(rng))
+        elif operacion == 'masiva':
+            response = cliente.post('/bulk_estado', json={
+                'ids': rng.sample(ids, min(len(ids), 3)), 'estado_pedido': rng.choice(main.ESTADOS_PEDIDO)})
+        elif operacion == 'importacion':
+            # Fechas repartidas en varios meses para ejercitar días y meses nuevos
+            filas = [dict(datos_aleatorios(rng), fecha_creacion=(
+                datetime(2026, 1, 1) + timedelta(days=rng.randrange(200), hours=rng.randrange(24))).isoformat())
+                for _ in range(rng.randrange(1, 4))]
+            response = cliente.post('/import_pedidos', json=filas)
+        else:
+            response = cliente.post(f'/delete_pedido/{rng.choice(ids)}')
+        assert response.status_code in (200, 302)
+
+    incremental = foto_resumen()
+    runner = main.app.test_cli_runner()
+    for comando in ('reconstruir-resumen', 'reconstruir-series'):
+        resultado = runner.invoke(args=[comando])
+        assert resultado.exit_code == 0, resultado.output
+    assert foto_resumen() == incremental
+    assert incremental['serie']
+
+
+def test_clave_nueva_existente_se_suma(db):
+    # Dos altas que crean la misma clave se acumulan en una sola fila
+    fecha = datetime(2026, 3, 14, 10, 0)
+    datos = dict.fromkeys(main.Pedido.__table__.columns.keys())
+    datos.update(nombre_cliente='Ana', precio=30.0, anticipo=30.0, estado_pago='Pagado Completo',
+                 estado_pedido='Completado', fecha_creacion=fecha, producto='Caja', forma_contacto='Email')
+    main.registrar_cambios_pedidos([(None, dict(datos, id=1))])
+    main.registrar_cambios_pedidos([(None, dict(datos, id=2))])
+    db.session.commit()
+    assert db.session.get(main.ResumenDiario, '2026-03-14').cantidad == 2
+    assert db.session.get(main.ResumenMensual, '2026-03').ingresos == 60.0
+    fila = main.SerieDiaria.query.one()
+    assert (fila.cantidad, fila.importe, fila.anticipos, fila.pendiente) == (2, 60.0, 60.0, 0.0)